@@ -0,0 +1 @@
+# Benchmarks e testes de carga do app (ver bench/carga.py)
@@ -0,0 +1,227 @@
+# Teste de carga do app.py com o Streamlit AppTest e um Supabase falso em memória
+# Uso: python -m bench.carga [--visitas 500000] [--vendedores 50] [--supervisores 2] [--reruns 10]
+# Simula login, cadastro de visitas e filtros dos supervisores em muitas sessões e mostra
+# a latência dos reruns (p50/p99), as linhas e bytes trazidos do "Supabase" e a memória por sessão.
+# O AppTest troca um Runtime global a cada run, então as sessões não rodam em paralelo: os reruns
+# de todas as sessões são intercalados (um de cada por vez), compartilhando os caches do processo
+# como num servidor real; as threads de fundo (fila de envio, métricas) rodam de verdade em paralelo
+import argparse
+import os
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from collections import defaultdict
+from datetime import date, timedelta
+
+import bcrypt
+
+from bench.supabase_falso import SupabaseFalso
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SENHA = "1234"
+NOMES = ["Ana", "Bruno", "Carla", "Diego", "Elisa", "Fábio", "Gabriela", "Heitor", "Isabela", "João", "Larissa", "Marcos"]
+SOBRENOMES = ["Silva", "Souza", "Oliveira", "Santos", "Lima", "Pereira", "Costa", "Ferreira", "Almeida", "Ribeiro"]
+RUAS = ["Rua das Flores", "Avenida Brasil", "Rua XV de Novembro", "Rua São João", "Avenida Paulista", "Rua Augusta"]
+OBSERVACOES = ["", "", "Quer orçamento", "Retornar na semana que vem", "Cliente indicado", "Pediu desconto"]
+
+# Visitas sintéticas espalhadas nos últimos dias, no formato gravado pelo formulário
+def gerar_visitas(quantidade, vendedores, dias):
+    hoje = date.today()
+    for _ in range(quantidade):
+        dia = hoje - timedelta(days=random.randrange(dias))
+        hora = f"{random.randrange(8, 19):02d}:{random.choice(['00', '15', '30', '45'])}"
+        fechou = random.choice(["Sim", "Não", "Em negociação"])
+        yield {
+            "Data": dia.strftime("%d/%m/%Y"),
+            "Hora": hora,
+            "DataVisita": dia.isoformat(),
+            "HoraVisita": hora + ":00",
+            "Nome": f"{random.choice(NOMES)} {random.choice(SOBRENOMES)}",
+            "Telefone": f"(11) 9{random.randrange(10 ** 7, 10 ** 8)}",
+            "Rua": random.choice(RUAS),
+            "Numero": str(random.randrange(1, 3000)),
+            "CEP": f"0{random.randrange(1000, 9999)}-{random.randrange(1000):03d}",
+            "Fechou": fechou,
+            "Valor": round(random.uniform(100, 5000), 2) if fechou == "Sim" else None,
+            "Observacao": random.choice(OBSERVACOES),
+            "Usuario": random.choice(vendedores),
+            "ChaveIdempotencia": str(uuid.uuid4()),
+        }
+
+def popular(banco, args, vendedores, supervisores):
+    senha = bcrypt.hashpw(SENHA.encode("utf-8"), bcrypt.gensalt(4)).decode("utf-8")
+    banco.table("usuarios").insert(
+        [{"nome": login, "login": login, "senha": senha, "papel": "vendedor", "equipe": "bench"} for login in vendedores]
+        + [{"nome": login, "login": login, "senha": senha, "papel": "supervisor", "equipe": "bench"} for login in supervisores]
+    ).execute()
+    # O histórico é gravado como se fosse de ontem: só as visitas da carga caem na janela de sincronização do cache
+    banco.tabelas["agendamentos"].recuo = timedelta(days=1)
+    lote = []
+    for visita in gerar_visitas(args.visitas, vendedores, args.dias):
+        lote.append(visita)
+        if len(lote) == 10000:
+            banco.table("agendamentos").insert(lote).execute()
+            lote = []
+    if lote:
+        banco.table("agendamentos").insert(lote).execute()
+    banco.tabelas["agendamentos"].recuo = timedelta(0)
+
+# Uma sessão do navegador: cada rerun é cronometrado e guardado no cenário correspondente
+class Sessao:
+    def __init__(self, login, resultados):
+        from streamlit.testing.v1 import AppTest
+        self.app = AppTest.from_file(os.path.join(RAIZ, "app.py"), default_timeout=120)
+        self.login = login
+        self.resultados = resultados
+
+    def rodar(self, cenario, acao=None):
+        if acao:
+            acao()
+        inicio = time.perf_counter()
+        self.app.run()
+        segundos = time.perf_counter() - inicio
+        if self.app.exception:
+            raise RuntimeError(f"{self.login} ({cenario}): {self.app.exception[0].message}")
+        self.resultados[cenario].append(segundos)
+
+    # Cada passo dos roteiros é um rerun; o yield devolve a vez para a próxima sessão
+    def entrar(self):
+        self.rodar("abrir página")
+        yield
+        self.app.text_input[0].input(self.login)
+        self.app.text_input[1].input(SENHA)
+        self.rodar("login", self.app.button[0].click)
+        yield
+
+    def botao(self, rotulo):
+        return next(botao for botao in self.app.button if botao.label == rotulo)
+
+    def campo(self, rotulo):
+        return next(campo for campo in self.app.text_input if campo.label == rotulo)
+
+def roteiro_vendedor(sessao, reruns):
+    yield from sessao.entrar()
+    for indice in range(reruns):
+        sessao.rodar("rerun vendedor")
+        yield
+        sessao.campo("Nome do Cliente").input(f"Cliente {indice}")
+        sessao.campo("Telefone do Cliente").input(f"119{random.randrange(10 ** 7, 10 ** 8)}")
+        sessao.campo("CEP").input(f"0{random.randrange(1000, 9999)}{random.randrange(1000):03d}")
+        sessao.rodar("cadastrar visita", sessao.botao("Marcar").click)
+        yield
+    if any(botao.label == "Carregar mais" for botao in sessao.app.button):
+        sessao.rodar("carregar mais", sessao.botao("Carregar mais").click)
+
+def roteiro_supervisor(sessao, reruns):
+    yield from sessao.entrar()
+    for indice in range(reruns):
+        sessao.rodar("rerun supervisor")
+        yield
+        filtro_data = next(campo for campo in sessao.app.date_input if campo.label == "Filtrar por Data")
+        sessao.rodar("filtrar por data", lambda: filtro_data.set_value(date.today() - timedelta(days=indice % 7)))
+        yield
+    if any(botao.label == "Carregar mais" for botao in sessao.app.button):
+        sessao.rodar("carregar mais", sessao.botao("Carregar mais").click)
+
+def percentil(valores, p):
+    if len(valores) == 1:
+        return valores[0]
+    return statistics.quantiles(valores, n=100, method="inclusive")[p - 1]
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga do app.py com Supabase falso")
+    parser.add_argument("--visitas", type=int, default=100000, help="visitas sintéticas na tabela")
+    parser.add_argument("--dias", type=int, default=365, help="dias cobertos pelas visitas")
+    parser.add_argument("--vendedores", type=int, default=50, help="sessões de vendedores")
+    parser.add_argument("--supervisores", type=int, default=2, help="sessões de supervisores")
+    parser.add_argument("--reruns", type=int, default=5, help="reruns (e cadastros) por sessão")
+    parser.add_argument("--latencia-ms", type=float, default=0, help="latência de rede simulada por requisição")
+    parser.add_argument("--semente", type=int, default=1)
+    parser.add_argument("--limite-p99-ms", type=float, help="falha (código 1) se algum cenário passar deste p99")
+    args = parser.parse_args()
+    random.seed(args.semente)
+
+    # Arquivos locais do app (fila, caches, métricas) num diretório temporário
+    temporario = tempfile.mkdtemp(prefix="crm-bench-")
+    os.environ.update({
+        "SUPABASE_URL": "http://supabase-falso", "SUPABASE_KEY": "chave-falsa", "SUPABASE_REALTIME": "0",
+        "FILA_ENVIO": os.path.join(temporario, "fila.sqlite3"),
+        "CACHE_CEP": os.path.join(temporario, "cep.sqlite3"),
+        "CACHE_GEOCODIGOS": os.path.join(temporario, "geocodigos.sqlite3"),
+        "METRICAS_ARQUIVO": os.path.join(temporario, "metricas.prom"),
+        "SESSOES_REVOGADAS": os.path.join(temporario, "sessoes_revogadas.sqlite3"),
+        "RESUMOS_PASTA": os.path.join(temporario, "resumos"),
+    })
+    sys.path.insert(0, RAIZ)
+
+    import crm.conexao
+
+    banco = SupabaseFalso(latencia=args.latencia_ms / 1000)
+    crm.conexao.create_client = lambda url, key, options=None: banco
+
+    vendedores = [f"Vendedor{numero:02d}" for numero in range(1, args.vendedores + 1)]
+    supervisores = [f"Supervisor{numero:02d}" for numero in range(1, args.supervisores + 1)]
+    inicio = time.perf_counter()
+    popular(banco, args, vendedores, supervisores)
+    print(f"{args.visitas} visitas geradas em {time.perf_counter() - inicio:.1f}s")
+
+    resultados = defaultdict(list)
+
+    # Primeira sessão: carga inicial do cache compartilhado (feita uma vez por processo)
+    requisicoes_antes, linhas_antes, bytes_antes = banco.totais()
+    inicio = time.perf_counter()
+    for _ in Sessao(supervisores[0], resultados).entrar():
+        pass
+    requisicoes, linhas, quantidade_bytes = (depois - antes for depois, antes in zip(banco.totais(), (requisicoes_antes, linhas_antes, bytes_antes)))
+    print(f"Carga inicial: {time.perf_counter() - inicio:.1f}s, {requisicoes} requisições, {linhas} linhas, {quantidade_bytes / 1e6:.1f} MB")
+    resultados.clear()
+
+    # Todas as sessões abertas ao mesmo tempo, com os reruns intercalados
+    requisicoes_antes, linhas_antes, bytes_antes = banco.totais()
+    tempo_supabase_antes = banco.tempo_gasto
+    tarefas = [(roteiro_vendedor, login, (args.reruns,)) for login in vendedores]
+    tarefas += [(roteiro_supervisor, login, (args.reruns,)) for login in supervisores]
+    ativas = [roteiro(Sessao(login, resultados), *parametros) for roteiro, login, parametros in tarefas]
+    inicio = time.perf_counter()
+    while ativas:
+        for sessao in list(ativas):
+            if next(sessao, StopIteration) is StopIteration:
+                ativas.remove(sessao)
+    duracao = time.perf_counter() - inicio
+    requisicoes, linhas, quantidade_bytes = (depois - antes for depois, antes in zip(banco.totais(), (requisicoes_antes, linhas_antes, bytes_antes)))
+    total_reruns = sum(len(tempos) for tempos in resultados.values())
+
+    print(f"\n{len(tarefas)} sessões, {total_reruns} reruns em {duracao:.1f}s")
+    print(f"{'cenário':<20}{'reruns':>8}{'p50 ms':>10}{'p99 ms':>10}{'máx ms':>10}")
+    for cenario, tempos in sorted(resultados.items()):
+        print(f"{cenario:<20}{len(tempos):>8}{percentil(tempos, 50) * 1000:>10.1f}{percentil(tempos, 99) * 1000:>10.1f}{max(tempos) * 1000:>10.1f}")
+    print(f"\nSupabase: {requisicoes} requisições, {linhas} linhas, {quantidade_bytes / 1e3:.0f} kB "
+          f"({linhas / total_reruns:.1f} linhas e {quantidade_bytes / total_reruns / 1e3:.1f} kB por rerun), "
+          f"{banco.tempo_gasto - tempo_supabase_antes:.1f}s dentro do Supabase falso")
+
+    # Memória acrescentada por sessão nova (estado da sessão e elementos; os caches já estão carregados)
+    # Os tempos dessas sessões ficam à parte: o tracemalloc as deixa mais lentas e não entram no limite de p99
+    amostras = min(5, len(vendedores))
+    tracemalloc.start()
+    antes = tracemalloc.take_snapshot()
+    sessoes = [Sessao(login, defaultdict(list)) for login in vendedores[:amostras]]
+    for sessao in sessoes:
+        for _ in sessao.entrar():
+            pass
+    diferenca = sum(estatistica.size_diff for estatistica in tracemalloc.take_snapshot().compare_to(antes, "filename"))
+    tracemalloc.stop()
+    print(f"Memória por sessão: {diferenca / amostras / 1e6:.2f} MB; pico do processo: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+
+    if args.limite_p99_ms:
+        lentos = [cenario for cenario, tempos in resultados.items() if percentil(tempos, 99) * 1000 > args.limite_p99_ms]
+        if lentos:
+            print(f"p99 acima de {args.limite_p99_ms:g} ms: {', '.join(sorted(lentos))}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+# Cliente Supabase falso, em memória, para os benchmarks (sem rede nem banco)
+# Implementa só o que o app usa do PostgREST: select/insert/upsert/update com os filtros
+# eq, gt, gte, lt, lte, in_ e or_ (com and(...) aninhado), order, limit e as funções kpis_visitas e buscar_visitas.
+# Os índices do banco real (id, AtualizadoEm, ChaveCliente) têm equivalentes aqui, para que o
+# custo medido seja o do app e não o de varrer a tabela falsa
+import bisect
+import json
+import re
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+from crm.formatacao import chave_cliente
+
+OPERADORES = {
+    "eq": lambda valor, alvo: valor == alvo,
+    "gt": lambda valor, alvo: valor is not None and valor > alvo,
+    "gte": lambda valor, alvo: valor is not None and valor >= alvo,
+    "lt": lambda valor, alvo: valor is not None and valor < alvo,
+    "lte": lambda valor, alvo: valor is not None and valor <= alvo,
+    "in": lambda valor, alvo: valor in alvo,
+}
+
+class Resposta:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+# Tabela em memória: linhas por id, ids em ordem e índices auxiliares
+class Tabela:
+    def __init__(self):
+        self.linhas = {}
+        self.ids = []
+        self.alteracoes = []  # (AtualizadoEm, id) em ordem de escrita
+        self.por_cliente = defaultdict(set)
+        self.proximo_id = 1
+        self.recuo = timedelta(0)  # quanto o "AtualizadoEm" das gravações fica no passado (visitas antigas)
+
+    def gravar(self, linha):
+        if "id" not in linha:
+            linha["id"] = self.proximo_id
+        self.proximo_id = max(self.proximo_id, linha["id"] + 1)
+        if linha["id"] not in self.linhas:
+            bisect.insort(self.ids, linha["id"])
+        # Colunas preenchidas pelo banco: gatilho de AtualizadoEm e coluna gerada ChaveCliente
+        linha["AtualizadoEm"] = (datetime.now(timezone.utc) - self.recuo).isoformat(timespec="microseconds")
+        if "Telefone" in linha:
+            linha["ChaveCliente"] = chave_cliente(linha.get("Telefone"), linha.get("CEP"))
+            self.por_cliente[linha["ChaveCliente"]].add(linha["id"])
+        self.linhas[linha["id"]] = linha
+        self.alteracoes.append((linha["AtualizadoEm"], linha["id"]))
+        return linha
+
+    # Ids candidatos para uma condição, usando os índices quando existem
+    def candidatos(self, coluna, operador, alvo):
+        if coluna == "id" and operador in ("gt", "gte"):
+            inicio = bisect.bisect_right(self.ids, alvo) if operador == "gt" else bisect.bisect_left(self.ids, alvo)
+            return self.ids[inicio:]
+        if coluna == "AtualizadoEm" and operador in ("gt", "gte", "eq"):
+            inicio = bisect.bisect_right(self.alteracoes, (alvo, float("inf"))) if operador == "gt" else bisect.bisect_left(self.alteracoes, (alvo, -1))
+            fim = bisect.bisect_right(self.alteracoes, (alvo, float("inf"))) if operador == "eq" else len(self.alteracoes)
+            return {id_ for _, id_ in self.alteracoes[inicio:fim]}
+        if coluna == "ChaveCliente" and operador == "eq":
+            return self.por_cliente.get(alvo, set())
+        return None
+
+class Consulta:
+    def __init__(self, banco, nome):
+        self.banco = banco
+        self.tabela = banco.tabelas[nome]
+        self.nome = nome
+        self.operacao = "select"
+        self.colunas = "*"
+        self.filtros = []  # (coluna, operador, alvo)
+        self.alternativas = []  # grupos de condições de or_ (cada grupo é um and)
+        self.ordem = []  # (coluna, desc), na ordem dos .order()
+        self.limite = None
+        self.dados = None
+        self.opcoes = {}
+
+    def select(self, colunas="*", count=None):
+        self.colunas = colunas
+        return self
+
+    def _filtro(self, operador, coluna, alvo):
+        self.filtros.append((coluna, operador, alvo))
+        return self
+
+    def eq(self, coluna, alvo):
+        return self._filtro("eq", coluna, alvo)
+
+    def gt(self, coluna, alvo):
+        return self._filtro("gt", coluna, alvo)
+
+    def gte(self, coluna, alvo):
+        return self._filtro("gte", coluna, alvo)
+
+    def lt(self, coluna, alvo):
+        return self._filtro("lt", coluna, alvo)
+
+    def lte(self, coluna, alvo):
+        return self._filtro("lte", coluna, alvo)
+
+    def in_(self, coluna, alvos):
+        return self._filtro("in", coluna, set(alvos))
+
+    # Só o formato usado pelo app: "coluna.operador.valor,...,and(coluna.operador.valor,...)"
+    def or_(self, texto):
+        for grupo in re.findall(r"and\(([^)]*)\)|([^,()]+)", texto):
+            condicoes = grupo[0].split(",") if grupo[0] else [grupo[1]]
+            self.alternativas.append([self._condicao(condicao) for condicao in condicoes])
+        return self
+
+    @staticmethod
+    def _condicao(texto):
+        coluna, operador, alvo = texto.split(".", 2)
+        return coluna, operador, int(alvo) if coluna == "id" else alvo
+
+    def order(self, coluna, desc=False):
+        self.ordem.append((coluna, desc))
+        return self
+
+    def limit(self, quantidade):
+        self.limite = quantidade
+        return self
+
+    def insert(self, dados, **opcoes):
+        self.operacao, self.dados = "insert", dados
+        return self
+
+    def upsert(self, dados, **opcoes):
+        self.operacao, self.dados, self.opcoes = "upsert", dados, opcoes
+        return self
+
+    def update(self, dados):
+        self.operacao, self.dados = "update", dados
+        return self
+
+    def _atende(self, linha):
+        if not all(OPERADORES[operador](linha.get(coluna), alvo) for coluna, operador, alvo in self.filtros):
+            return False
+        if self.alternativas:
+            return any(
+                all(OPERADORES[operador](linha.get(coluna), alvo) for coluna, operador, alvo in grupo)
+                for grupo in self.alternativas
+            )
+        return True
+
+    def _ids_candidatos(self):
+        if self.alternativas:
+            ids = set()
+            for grupo in self.alternativas:
+                candidatos = self.tabela.candidatos(*grupo[0])
+                if candidatos is None:
+                    return self.tabela.ids
+                ids.update(candidatos)
+            return sorted(ids)
+        for condicao in self.filtros:
+            candidatos = self.tabela.candidatos(*condicao)
+            if candidatos is not None:
+                return candidatos if isinstance(candidatos, list) else sorted(candidatos)
+        return self.tabela.ids
+
+    def _selecionar(self):
+        if self.limite == 0:
+            return []
+        ids = self._ids_candidatos()
+        coluna, desc = self.ordem[0] if self.ordem else ("id", False)
+        if coluna == "id" and len(self.ordem) <= 1:
+            # Percorre já na ordem do índice e para ao atingir o limite
+            encontradas = []
+            for id_ in (reversed(ids) if desc else ids):
+                linha = self.tabela.linhas[id_]
+                if self._atende(linha):
+                    encontradas.append(linha)
+                    if self.limite is not None and len(encontradas) == self.limite:
+                        break
+            return encontradas
+        encontradas = [linha for linha in map(self.tabela.linhas.get, ids) if self._atende(linha)]
+        # Ordenações estáveis aplicadas da última para a primeira, como "order by a, b"
+        for coluna, desc in reversed(self.ordem):
+            encontradas.sort(key=lambda linha: (linha.get(coluna) is None, linha.get(coluna)), reverse=desc)
+        return encontradas[:self.limite] if self.limite is not None else encontradas
+
+    def _executar(self):
+        if self.operacao in ("insert", "upsert"):
+            dados = self.dados if isinstance(self.dados, list) else [self.dados]
+            gravadas = []
+            with self.banco.lock:
+                for linha in dados:
+                    chave = linha.get("ChaveIdempotencia")
+                    if self.operacao == "upsert" and chave in self.banco.chaves_idempotencia:
+                        continue
+                    if chave:
+                        self.banco.chaves_idempotencia.add(chave)
+                    gravadas.append(self.tabela.gravar(dict(linha)))
+            self.banco.notificar(self.nome, gravadas)
+            return [] if self.opcoes.get("returning") == "minimal" else gravadas
+        if self.operacao == "update":
+            with self.banco.lock:
+                alteradas = self._selecionar()
+                for linha in alteradas:
+                    linha.update(self.dados)
+                    self.tabela.gravar(linha)
+            self.banco.notificar(self.nome, alteradas)
+            return alteradas
+        if self.colunas.strip() == "count":
+            return [{"count": len(self.tabela.linhas)}]
+        linhas = self._selecionar()
+        if self.colunas.strip() == "*":
+            return [dict(linha) for linha in linhas]
+        colunas = [coluna.strip() for coluna in self.colunas.split(",")]
+        return [{coluna: linha.get(coluna) for coluna in colunas} for linha in linhas]
+
+    def execute(self):
+        return self.banco.registrar(self.nome, self._executar)
+
+class ChamadaRpc:
+    def __init__(self, banco, nome, parametros):
+        self.banco = banco
+        self.nome = nome
+        self.parametros = parametros
+
+    def execute(self):
+        funcao = getattr(self.banco, f"rpc_{self.nome}")
+        return self.banco.registrar(self.nome, lambda: funcao(**self.parametros))
+
+# Banco falso compartilhado por todas as sessões; conta requisições, linhas e bytes devolvidos
+# Quem estiver em ao_gravar recebe cada linha gravada, como os eventos do Supabase Realtime
+class SupabaseFalso:
+    def __init__(self, latencia=0.0):
+        self.ao_gravar = []  # funções (tabela, linha)
+        self.latencia = latencia  # segundos de "rede" somados a cada requisição
+        self.tabelas = defaultdict(Tabela)
+        self.chaves_idempotencia = set()
+        self.lock = threading.Lock()
+        self.requisicoes = defaultdict(int)
+        self.linhas_devolvidas = defaultdict(int)
+        self.bytes_devolvidos = defaultdict(int)
+        self.tempo_gasto = 0.0
+
+    def table(self, nome):
+        return Consulta(self, nome)
+
+    def rpc(self, nome, parametros):
+        return ChamadaRpc(self, nome, parametros)
+
+    def registrar(self, recurso, executar):
+        inicio = time.perf_counter()
+        if self.latencia:
+            time.sleep(self.latencia)
+        dados = executar()
+        with self.lock:
+            self.tempo_gasto += time.perf_counter() - inicio
+            self.requisicoes[recurso] += 1
+            self.linhas_devolvidas[recurso] += len(dados) if isinstance(dados, list) else 1
+            self.bytes_devolvidos[recurso] += len(json.dumps(dados, default=str))
+        return Resposta(dados)
+
+    def notificar(self, tabela, linhas):
+        for linha in linhas:
+            for callback in self.ao_gravar:
+                callback(tabela, dict(linha))
+
+    def totais(self):
+        with self.lock:
+            return sum(self.requisicoes.values()), sum(self.linhas_devolvidas.values()), sum(self.bytes_devolvidos.values())
+
+    def _visitas(self, data_inicio=None, data_fim=None, vendedores=None):
+        for linha in self.tabelas["agendamentos"].linhas.values():
+            if vendedores is not None and linha.get("Usuario") not in vendedores:
+                continue
+            if data_inicio is not None and not (data_inicio <= (linha.get("DataVisita") or "") <= data_fim):
+                continue
+            yield linha
+
+    # Mesmo formato de sql/006_kpis_visitas.sql
+    def rpc_kpis_visitas(self, data_inicio, data_fim, vendedores=None):
+        por_fechou = defaultdict(int)
+        por_vendedor = defaultdict(lambda: [0, 0, 0.0])
+        por_dia = defaultdict(int)
+        for linha in self._visitas(data_inicio, data_fim, vendedores and set(vendedores)):
+            por_fechou[linha.get("Fechou")] += 1
+            totais = por_vendedor[linha.get("Usuario")]
+            totais[0] += 1
+            totais[1] += linha.get("Fechou") == "Sim"
+            totais[2] += linha.get("Valor") or 0
+            por_dia[linha["DataVisita"]] += 1
+        por_semana = defaultdict(int)
+        for dia, visitas in por_dia.items():
+            data = datetime.fromisoformat(dia).date()
+            por_semana[(data - timedelta(days=data.weekday())).isoformat()] += visitas
+        return {
+            "por_fechou": [{"fechou": fechou, "visitas": visitas} for fechou, visitas in por_fechou.items()],
+            "por_vendedor": [
+                {"vendedor": vendedor, "visitas": visitas, "fechadas": fechadas, "valor": valor}
+                for vendedor, (visitas, fechadas, valor) in por_vendedor.items()
+            ],
+            "por_dia": [{"dia": dia, "visitas": visitas} for dia, visitas in sorted(por_dia.items())],
+            "por_semana": [{"semana": semana, "visitas": visitas} for semana, visitas in sorted(por_semana.items())],
+        }
+
+    # Aproximação de sql/010_busca_visitas.sql: trechos do termo no nome, endereço ou observação
+    def rpc_buscar_visitas(self, termo, vendedores=None, limite=50, deslocamento=0):
+        palavras = termo.lower().split()
+        encontradas = []
+        for linha in self._visitas(vendedores=vendedores and set(vendedores)):
+            texto = " ".join(filter(None, [linha.get("Nome"), linha.get("Rua"), linha.get("Observacao")])).lower()
+            relevancia = sum(palavra in texto for palavra in palavras)
+            if relevancia:
+                encontradas.append((relevancia, linha["id"], linha))
+        encontradas.sort(key=lambda item: (-item[0], -item[1]))
+        return [dict(linha, relevancia=relevancia) for relevancia, _, linha in encontradas[deslocamento:deslocamento + limite]]
@@ -0,0 +1,98 @@
+# Conferência do assinante do realtime com o publicador local ligado ao Supabase falso
+# Uso: python -m bench.tempo_real [--visitas 200000] [--eventos 500]
+# Cada gravação no banco falso vira um evento do PublicadorLocal, como faria o Supabase Realtime. Confere que
+# o cache recebe as linhas novas e alteradas, que só as sessões interessadas pedem rerun e que as sessões
+# encerradas saem do registro; mostra o tempo de aplicação de cada evento no cache
+import argparse
+import random
+import statistics
+import sys
+import time
+from datetime import date
+
+from bench.carga import gerar_visitas
+from bench.supabase_falso import SupabaseFalso
+
+def main():
+    parser = argparse.ArgumentParser(description="Conferência do assinante do realtime com publicador local")
+    parser.add_argument("--visitas", type=int, default=200000, help="visitas já existentes no cache")
+    parser.add_argument("--eventos", type=int, default=500, help="gravações publicadas durante o teste")
+    parser.add_argument("--semente", type=int, default=1)
+    args = parser.parse_args()
+    random.seed(args.semente)
+
+    from crm.agendamentos import CacheAgendamentos
+    from crm.tempo_real import AssinanteAgendamentos, PublicadorLocal
+
+    banco = SupabaseFalso()
+    vendedores = ["Vendedor01", "Vendedor02", "Vendedor03"]
+    lote = list(gerar_visitas(args.visitas, vendedores, 30))
+    for inicio in range(0, len(lote), 10000):
+        banco.table("agendamentos").insert(lote[inicio:inicio + 10000]).execute()
+    cache = CacheAgendamentos(banco, intervalo=3600)
+    cache.sincronizar(forcar=True)
+
+    # Sessões abertas: "encerrada" não existe mais no servidor
+    pedidos = []
+    def rerun(session_id, apenas_conferir=False):
+        if session_id == "encerrada":
+            return False
+        if not apenas_conferir:
+            pedidos.append(session_id)
+        return True
+
+    publicador = PublicadorLocal()
+    assinante = AssinanteAgendamentos(cache, publicador, rerun=rerun)
+    hoje = date.today()
+    assinante.registrar("vendedor01", ["Vendedor01"])
+    assinante.registrar("vendedor02", ["Vendedor02"])
+    assinante.registrar("supervisor-hoje", vendedores, hoje)
+    assinante.registrar("encerrada", ["Vendedor01"])
+
+    tempos = []
+    def publicar(tabela, linha):
+        if tabela == "agendamentos":
+            inicio = time.perf_counter()
+            publicador.publicar(linha)
+            tempos.append(time.perf_counter() - inicio)
+    banco.ao_gravar.append(publicar)
+
+    falhas = []
+    def conferir(condicao, descricao):
+        if not condicao:
+            falhas.append(descricao)
+
+    # Visita nova de hoje do Vendedor01: interessa ao próprio vendedor e ao supervisor do dia
+    nova = next(gerar_visitas(1, ["Vendedor01"], 1))
+    banco.table("agendamentos").insert(nova).execute()
+    conferir(cache.visitas["id"].iloc[0] == max(banco.tabelas["agendamentos"].linhas), "visita nova fora do cache")
+    conferir(sorted(pedidos) == ["supervisor-hoje", "vendedor01"], f"reruns da visita nova: {sorted(pedidos)}")
+    conferir("encerrada" not in assinante.sessoes, "sessão encerrada continua registrada")
+
+    # Alteração de uma visita antiga do Vendedor02 (fora do dia do supervisor)
+    pedidos.clear()
+    antiga = next(linha for linha in banco.tabelas["agendamentos"].linhas.values() if linha["Usuario"] == "Vendedor02" and linha["DataVisita"] != hoje.isoformat())
+    banco.table("agendamentos").update({"Fechou": "Sim", "Observacao": "Alterada pelo realtime"}).eq("id", antiga["id"]).execute()
+    linha = cache.visitas[cache.visitas["id"] == antiga["id"]]
+    conferir(len(linha) == 1 and linha["Observacao"].iloc[0] == "Alterada pelo realtime", "alteração não chegou ao cache")
+    conferir(pedidos == ["vendedor02"], f"reruns da alteração: {pedidos}")
+
+    # Rajada de gravações: o cache continua igual à tabela
+    for indice in range(args.eventos):
+        if indice % 2:
+            banco.table("agendamentos").insert(next(gerar_visitas(1, vendedores, 7))).execute()
+        else:
+            banco.table("agendamentos").update({"Nome": f"Cliente {indice}"}).eq("id", random.randint(1, args.visitas)).execute()
+    tabela = sorted(banco.tabelas["agendamentos"].linhas.values(), key=lambda linha: -linha["id"])
+    conferir(cache.visitas["id"].tolist() == [linha["id"] for linha in tabela], "ids do cache diferentes da tabela")
+    conferir(cache.visitas["Nome"].tolist() == [linha["Nome"] for linha in tabela], "nomes do cache diferentes da tabela")
+
+    print(f"{len(tempos)} eventos aplicados num cache de {len(cache.visitas)} visitas")
+    print(f"por evento: p50 {statistics.median(tempos) * 1000:.1f} ms, máx {max(tempos) * 1000:.1f} ms")
+    if falhas:
+        print("Falhas:\n- " + "\n- ".join(falhas))
+        sys.exit(1)
+    print("Assinante ok")
+
+if __name__ == "__main__":
+    main()
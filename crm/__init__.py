@@ -0,0 +1 @@
+# Camada de dados e componentes de interface compartilhados por app.py e app3.py
@@ -0,0 +1,285 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pyarrow as pa
+import streamlit as st
+
+from crm.conexao import ERROS_SUPABASE, init_connection
+from crm.fila_envio import FilaEnvio
+from crm.metricas import cache_data_medido, medir, registrar_cache
+
+# Colunas buscadas no Supabase (somente as exibidas, em vez de select("*"))
+COLUNAS_VISITAS = "id,Data,Hora,Nome,Telefone,Rua,Numero,CEP,Fechou,Valor,Observacao,Usuario"
+
+# Quantidade de visitas carregadas por vez nas tabelas (configurável por variável de ambiente)
+TAMANHO_PAGINA = int(os.environ.get("TAMANHO_PAGINA", 50))
+
+# Duração considerada para cada visita na conferência de conflito de horário (minutos)
+DURACAO_VISITA = int(os.environ.get("DURACAO_VISITA", 60))
+
+# Colunas da agenda semanal (a chave de idempotência identifica as visitas que ainda estão na fila)
+COLUNAS_AGENDA = COLUNAS_VISITAS + ",DataVisita,HoraVisita,ChaveIdempotencia"
+
+# Colunas guardadas no cache de agendamentos (as exibidas mais as usadas em filtros e na sincronização)
+COLUNAS_CACHE = COLUNAS_VISITAS + ",DataVisita,HoraVisita,AtualizadoEm"
+
+# Intervalo mínimo entre duas sincronizações do cache e tamanho dos lotes lidos do Supabase
+INTERVALO_SINCRONIZACAO = 10
+LOTE_SINCRONIZACAO = 1000
+# Quanto a sincronização relê antes da leitura anterior (segundos): escritas concorrentes gravam
+# "AtualizadoEm" no início da transação, e uma transação que termina depois de outra mais nova
+# aparece com id e "AtualizadoEm" anteriores aos cursores (vale para transações mais curtas que a janela)
+JANELA_SINCRONIZACAO = 60
+# Emendas acumuladas antes de compactar o cache; acima de tantas linhas alteradas de uma vez, reconstrói
+LIMITE_EMENDAS = 64
+LIMITE_ALTERADAS = 1000
+
+# Cache de agendamentos compartilhado por todas as sessões do processo
+# Na primeira leitura carrega a tabela em lotes; depois busca somente as linhas novas (id maior
+# que o último conhecido) ou alteradas depois da última alteração vista. O cursor de alterações recua
+# até JANELA_SINCRONIZACAO antes da leitura anterior, para pegar as transações que terminaram fora de
+# ordem; as linhas já conhecidas relidas nessa janela são descartadas por aplicar()
+class CacheAgendamentos:
+    def __init__(self, cliente, intervalo=INTERVALO_SINCRONIZACAO):
+        self.cliente = cliente
+        self.intervalo = intervalo
+        self.visitas = pd.DataFrame(columns=COLUNAS_CACHE.split(","))
+        self.ultimo_id = None
+        self.ultima_alteracao = pd.Timestamp(0, tz="UTC")
+        self.ultima_leitura = None  # início da leitura anterior no Supabase
+        self.ultima_sincronizacao = 0.0
+        self.emendas = 0
+        self.lock = threading.Lock()
+
+    # Lê do Supabase em lotes ordenados por id (o PostgREST limita a quantidade de linhas por resposta)
+    def _ler_em_lotes(self, filtro=None):
+        linhas = []
+        cursor = 0
+        while True:
+            consulta = self.cliente.table("agendamentos").select(COLUNAS_CACHE).gt("id", cursor)
+            if filtro:
+                consulta = consulta.or_(filtro)
+            lote = consulta.order("id").limit(LOTE_SINCRONIZACAO).execute().data
+            linhas.extend(lote)
+            if len(lote) < LOTE_SINCRONIZACAO:
+                return linhas
+            cursor = lote[-1]["id"]
+
+    # Junta linhas novas ou alteradas ao cache, que fica ordenado por id decrescente
+    # Alteradas são trocadas na própria posição e novas (ids acima dos do cache) entram no topo, emendando
+    # fatias do DataFrame em vez de copiá-lo e reordená-lo; linhas que não mudaram são ignoradas
+    def aplicar(self, linhas):
+        novas = pd.DataFrame(linhas).reindex(columns=self.visitas.columns)
+        # "Valor" fica numérico no cache; a formatação em real é só na exibição
+        novas["Valor"] = pd.to_numeric(novas["Valor"], errors="coerce")
+        alteracoes = pd.to_datetime(novas["AtualizadoEm"], utc=True, errors="coerce")
+        with self.lock:
+            visitas = self.visitas
+            posicoes = pd.Index(visitas["id"]).get_indexer(novas["id"])
+            existentes = posicoes >= 0
+            # Só substitui a linha do cache por uma versão mais nova: uma leitura feita antes de um evento do
+            # realtime já aplicado (ou relida na janela de sincronização) não volta a linha para trás
+            mudaram = existentes.copy()
+            if existentes.any():
+                atuais = pd.to_datetime(visitas["AtualizadoEm"].to_numpy()[posicoes[existentes]], utc=True, errors="coerce")
+                recebidas = pd.DatetimeIndex(alteracoes)[existentes]
+                mudaram[existentes] = (recebidas > atuais) | atuais.isna()
+            inseridas = novas[~existentes].sort_values("id", ascending=False)
+            # Id menor que algum do cache (transação gravada fora de ordem) ou alteração em massa: reconstrói
+            fora_de_ordem = not inseridas.empty and not visitas.empty and inseridas["id"].iloc[-1] < visitas["id"].iloc[0]
+            if fora_de_ordem or mudaram.sum() > LIMITE_ALTERADAS:
+                atuais = visitas[~visitas["id"].isin(novas["id"][mudaram])]
+                visitas = pd.concat([novas[mudaram | ~existentes], atuais], ignore_index=True)
+                visitas = self._compactar(visitas.sort_values("id", ascending=False, ignore_index=True))
+            else:
+                if mudaram.any():
+                    alteradas = novas[mudaram].assign(posicao=posicoes[mudaram]).sort_values("posicao")
+                    trechos, inicio = [], 0
+                    for indice, posicao in enumerate(alteradas.pop("posicao")):
+                        trechos += [visitas.iloc[inicio:posicao], alteradas.iloc[[indice]]]
+                        inicio = posicao + 1
+                    visitas = pd.concat(trechos + [visitas.iloc[inicio:]], ignore_index=True)
+                    self.emendas += len(trechos)
+                if not inseridas.empty:
+                    visitas = pd.concat([inseridas, visitas], ignore_index=True) if not visitas.empty else inseridas.reset_index(drop=True)
+                    self.emendas += 1
+                if self.emendas > LIMITE_EMENDAS:
+                    visitas = self._compactar(visitas)
+            # Troca o DataFrame inteiro de uma vez: quem estiver lendo continua com a versão anterior
+            self.visitas = visitas
+            self.ultimo_id = max(self.ultimo_id or 0, int(novas["id"].max()))
+            if alteracoes.notna().any():
+                self.ultima_alteracao = max(self.ultima_alteracao, alteracoes.max())
+
+    # Cada emenda deixa as colunas de texto em mais pedaços na memória, o que torna os filtros mais lentos;
+    # de tempos em tempos o cache é regravado em blocos contínuos
+    def _compactar(self, visitas):
+        self.emendas = 0
+        return pa.Table.from_pandas(visitas, preserve_index=False).combine_chunks().to_pandas()
+
+    def sincronizar(self, forcar=False):
+        if not forcar and time.monotonic() - self.ultima_sincronizacao < self.intervalo:
+            registrar_cache("agendamentos", True)
+            return
+        registrar_cache("agendamentos", False)
+        with self.lock:
+            # Outra sessão pode ter sincronizado enquanto esta esperava o lock
+            if not forcar and time.monotonic() - self.ultima_sincronizacao < self.intervalo:
+                return
+            self.ultima_sincronizacao = time.monotonic()
+            leitura = pd.Timestamp.now(tz="UTC")
+            if self.ultimo_id is None:
+                linhas = self._ler_em_lotes()
+                self.ultimo_id = 0
+            else:
+                desde = min(self.ultima_alteracao, self.ultima_leitura - pd.Timedelta(seconds=JANELA_SINCRONIZACAO))
+                linhas = self._ler_em_lotes(f"id.gt.{self.ultimo_id},AtualizadoEm.gt.{desde.isoformat()}")
+            self.ultima_leitura = leitura
+        if linhas:
+            with medir("cache agendamentos: aplicar linhas"):
+                self.aplicar(linhas)
+
+    # Filtra o cache em memória, mantendo a mesma paginação por id das tabelas
+    def consultar(self, usuarios=None, data=None, antes_de_id=None, depois_de_id=None, limite=TAMANHO_PAGINA):
+        self.sincronizar()
+        visitas = self.visitas
+        mascara = pd.Series(True, index=visitas.index)
+        if usuarios is not None:
+            mascara &= visitas["Usuario"].isin(usuarios)
+        if data is not None:
+            mascara &= visitas["DataVisita"] == data.isoformat()
+        if antes_de_id is not None:
+            mascara &= visitas["id"] < antes_de_id
+        if depois_de_id is not None:
+            mascara &= visitas["id"] > depois_de_id
+        resultado = visitas.loc[mascara, COLUNAS_VISITAS.split(",")]
+        if depois_de_id is None:
+            resultado = resultado.head(limite)
+        return resultado.reset_index(drop=True)
+
+# Um único cache por processo, compartilhado entre todas as sessões
+@st.cache_resource
+def obter_cache_agendamentos():
+    return CacheAgendamentos(init_connection())
+
+# Depois de cada lote enviado: traz as visitas para o cache e descarta as agendas já lidas,
+# para que a visita saindo da fila não suma da agenda até o cache expirar
+def atualizar_apos_envio():
+    obter_cache_agendamentos().sincronizar(forcar=True)
+    ler_agenda.clear()
+
+# Fila local de envio compartilhada pelas sessões
+@st.cache_resource
+def obter_fila_envio():
+    return FilaEnvio(
+        init_connection(),
+        os.environ.get("FILA_ENVIO", "fila_envio.sqlite3"),
+        ao_enviar=atualizar_apos_envio
+    )
+
+# Função para salvar agendamento (usada pelos vendedores)
+# A visita vai para a fila local e é enviada em segundo plano: o formulário não espera o Supabase
+def salvar_agendamento(agendamento):
+    return obter_fila_envio().enfileirar(agendamento)
+
+# Quantidade de visitas do usuário ainda na fila de envio
+def contar_pendentes(usuario):
+    return obter_fila_envio().pendentes(usuario)
+
+# Visitas do usuário recusadas pelo banco (com o erro), que não serão reenviadas
+def listar_rejeitadas(usuario):
+    return obter_fila_envio().rejeitadas(usuario)
+
+def descartar_rejeitadas(usuario):
+    obter_fila_envio().descartar_rejeitadas(usuario)
+
+# Função para ler agendamentos filtrados por usuário
+def ler_agendamentos_por_usuario(usuario, antes_de_id=None, depois_de_id=None, limite=TAMANHO_PAGINA):
+    return obter_cache_agendamentos().consultar(usuarios=[usuario], antes_de_id=antes_de_id, depois_de_id=depois_de_id, limite=limite)
+
+# Função para ler os agendamentos de um dia dos vendedores informados (usada pelos supervisores)
+def ler_agendamentos_filtrados(data, vendedores, antes_de_id=None, depois_de_id=None, limite=TAMANHO_PAGINA):
+    return obter_cache_agendamentos().consultar(usuarios=vendedores, data=data, antes_de_id=antes_de_id, depois_de_id=depois_de_id, limite=limite)
+
+# Função para buscar as visitas anteriores de um cliente (busca pelo índice de "ChaveCliente")
+# Com usuarios, traz só as visitas desses vendedores (a equipe do supervisor)
+def buscar_historico_cliente(chave, usuarios=None, limite=TAMANHO_PAGINA):
+    if not chave:
+        return pd.DataFrame(columns=COLUNAS_VISITAS.split(",") + ["DataVisita"])
+    consulta = init_connection().table("agendamentos").select(COLUNAS_VISITAS + ",DataVisita").eq("ChaveCliente", chave)
+    if usuarios is not None:
+        consulta = consulta.in_("Usuario", usuarios)
+    response = consulta.order("id", desc=True).limit(limite).execute()
+    return pd.DataFrame(response.data, columns=COLUNAS_VISITAS.split(",") + ["DataVisita"])
+
+# Visitas de alguns vendedores entre duas datas, por dia e horário (índice Usuario, DataVisita, HoraVisita)
+# Traz só o intervalo pedido (a semana exibida na agenda)
+@cache_data_medido(ttl=30)
+def ler_agenda(vendedores, data_inicio, data_fim):
+    response = (
+        init_connection().table("agendamentos").select(COLUNAS_AGENDA)
+        .in_("Usuario", list(vendedores))
+        .gte("DataVisita", data_inicio.isoformat())
+        .lte("DataVisita", data_fim.isoformat())
+        .order("DataVisita").order("HoraVisita")
+        .execute()
+    )
+    return pd.DataFrame(response.data, columns=COLUNAS_AGENDA.split(","))
+
+# Visitas do usuário ainda na fila de envio, no mesmo formato da agenda
+def listar_pendentes(usuario):
+    pendentes = obter_fila_envio().listar(usuario)
+    return pd.DataFrame(pendentes, columns=COLUNAS_AGENDA.split(","))
+
+# Visitas do usuário que se sobrepõem ao horário informado (DataVisita "AAAA-MM-DD", HoraVisita "HH:MM")
+# Consulta só a faixa de horário do dia no índice e inclui as visitas ainda na fila de envio
+# Sem conexão com o Supabase, confere somente a fila de envio
+def buscar_conflitos(usuario, data_visita, hora_visita):
+    inicio = datetime.fromisoformat(f"{data_visita}T{hora_visita[:5]}")
+    de = max(inicio - timedelta(minutes=DURACAO_VISITA), inicio.replace(hour=0, minute=0))
+    ate = min(inicio + timedelta(minutes=DURACAO_VISITA), inicio.replace(hour=23, minute=59))
+    try:
+        response = (
+            init_connection().table("agendamentos").select(COLUNAS_AGENDA)
+            .eq("Usuario", usuario).eq("DataVisita", data_visita)
+            .gt("HoraVisita", de.strftime("%H:%M:%S")).lt("HoraVisita", ate.strftime("%H:%M:%S"))
+            .execute()
+        )
+        conflitos = pd.DataFrame(response.data, columns=COLUNAS_AGENDA.split(","))
+    except ERROS_SUPABASE:
+        conflitos = pd.DataFrame(columns=COLUNAS_AGENDA.split(","))
+    pendentes = listar_pendentes(usuario)
+    if not pendentes.empty:
+        horas = pendentes["HoraVisita"].fillna("").str[:5]
+        na_faixa = (
+            (pendentes["DataVisita"] == data_visita) & (horas > de.strftime("%H:%M")) & (horas < ate.strftime("%H:%M"))
+            & ~pendentes["ChaveIdempotencia"].isin(conflitos["ChaveIdempotencia"])
+        )
+        conflitos = pd.concat([conflitos, pendentes[na_faixa]], ignore_index=True) if na_faixa.any() else conflitos
+    return conflitos
+
+# Função para buscar visitas por nome, endereço ou observação (busca e ordenação feitas no Supabase)
+# Retorna uma página de resultados, dos mais relevantes para os menos, e se há mais páginas
+@cache_data_medido(ttl=60)
+def buscar_visitas(termo, vendedores, deslocamento=0, limite=TAMANHO_PAGINA):
+    response = init_connection().rpc("buscar_visitas", {
+        "termo": termo,
+        "vendedores": list(vendedores),
+        "limite": limite + 1,
+        "deslocamento": deslocamento
+    }).execute()
+    resultados = pd.DataFrame(response.data, columns=COLUNAS_VISITAS.split(","))
+    return resultados.head(limite), len(resultados) > limite
+
+# Função para ler os indicadores do acompanhamento (agregados calculados no Supabase pela função kpis_visitas)
+@cache_data_medido(ttl=60)
+def ler_indicadores(data_inicio, data_fim, vendedores):
+    response = init_connection().rpc("kpis_visitas", {
+        "data_inicio": data_inicio.isoformat(),
+        "data_fim": data_fim.isoformat(),
+        "vendedores": list(vendedores)
+    }).execute()
+    return response.data
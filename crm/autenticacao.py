@@ -0,0 +1,201 @@
+import base64
+import hashlib
+import hmac
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as TempoEsgotado
+
+import streamlit as st
+
+from crm.metricas import medir
+from crm.usuarios import autenticar_usuario
+
+# Verificações de senha (bcrypt) executadas ao mesmo tempo no processo inteiro
+VERIFICACOES_SIMULTANEAS = 2
+# Tempo máximo de espera por uma verificação na fila
+TIMEOUT_VERIFICACAO = 15
+# Verificações aguardando na fila além das em execução; acima disso o login é recusado na hora
+FILA_VERIFICACOES = 8
+# Tentativas com falha permitidas por janela de tempo, por login e por IP
+JANELA_TENTATIVAS = 5 * 60
+TENTATIVAS_POR_LOGIN = 5
+TENTATIVAS_POR_IP = 20
+# Validade do token de sessão (evita novo login ao recarregar a página)
+VALIDADE_SESSAO = 12 * 3600
+# Tamanho mínimo de SEGREDO_SESSAO; sem um segredo próprio os tokens ficam desativados
+TAMANHO_MINIMO_SEGREDO = 32
+
+class LoginBloqueado(Exception):
+    pass
+
+# Verificação de senha não concluída (fila cheia ou tempo esgotado): o usuário deve tentar de novo
+class VerificacaoIndisponivel(Exception):
+    pass
+
+# Limita as tentativas com falha numa janela deslizante de tempo
+# Só guarda as chaves com falhas dentro da janela: quem testa muitos logins ou IPs não faz o registro crescer sem limite
+class LimitadorTentativas:
+    def __init__(self, janela=JANELA_TENTATIVAS):
+        self.janela = janela
+        self.falhas = {}  # chave -> horários das falhas
+        self.ultima_limpeza = time.monotonic()
+        self.lock = threading.Lock()
+
+    # Falhas da chave ainda dentro da janela; a chave sai do registro quando não sobra nenhuma
+    def _recentes(self, chave, agora):
+        falhas = self.falhas.get(chave)
+        if falhas is None:
+            return 0
+        while falhas and agora - falhas[0] > self.janela:
+            falhas.popleft()
+        if not falhas:
+            del self.falhas[chave]
+        return len(falhas)
+
+    def bloqueado(self, chave, limite):
+        with self.lock:
+            return self._recentes(chave, time.monotonic()) >= limite
+
+    def registrar_falha(self, chave):
+        with self.lock:
+            agora = time.monotonic()
+            self._recentes(chave, agora)
+            self.falhas.setdefault(chave, deque()).append(agora)
+            # Uma vez por janela, descarta as chaves que não falharam mais
+            if agora - self.ultima_limpeza > self.janela:
+                self.ultima_limpeza = agora
+                for antiga in [antiga for antiga, falhas in self.falhas.items() if agora - falhas[-1] > self.janela]:
+                    del self.falhas[antiga]
+
+    def limpar(self, chave):
+        with self.lock:
+            self.falhas.pop(chave, None)
+
+# Pool limitado para o bcrypt: uma rajada de logins não ocupa a CPU de todas as sessões
+# O semáforo limita também a fila: verificações em execução mais as que aguardam
+class PoolAutenticacao:
+    def __init__(self, simultaneas=VERIFICACOES_SIMULTANEAS, fila=FILA_VERIFICACOES):
+        self.executor = ThreadPoolExecutor(max_workers=simultaneas, thread_name_prefix="bcrypt")
+        self.vagas = threading.BoundedSemaphore(simultaneas + fila)
+
+    def verificar(self, funcao, *args, timeout=TIMEOUT_VERIFICACAO):
+        if not self.vagas.acquire(blocking=False):
+            raise VerificacaoIndisponivel("Servidor ocupado. Tente entrar novamente em alguns segundos.")
+        futuro = self.executor.submit(funcao, *args)
+        futuro.add_done_callback(lambda _: self.vagas.release())
+        try:
+            return futuro.result(timeout=timeout)
+        except TempoEsgotado:
+            # Se ainda estiver na fila, a verificação nem chega a rodar
+            futuro.cancel()
+            raise VerificacaoIndisponivel("A verificação da senha demorou demais. Tente entrar novamente.")
+
+@st.cache_resource
+def obter_pool_autenticacao():
+    return PoolAutenticacao()
+
+@st.cache_resource
+def obter_limitador():
+    return LimitadorTentativas()
+
+# Tokens encerrados pelo botão "Sair" antes de expirar, guardados em SQLite (sobrevivem a reinícios)
+# Cada token fica registrado só até a própria validade; os vencidos são apagados a cada revogação
+class TokensRevogados:
+    def __init__(self, arquivo="sessoes_revogadas.sqlite3"):
+        self.conexao = sqlite3.connect(arquivo, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.conexao:
+            self.conexao.execute("create table if not exists revogados (resumo text primary key, expira integer not null)")
+
+    @staticmethod
+    def _resumo(token):
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def revogar(self, token, expira):
+        with self.lock, self.conexao:
+            self.conexao.execute("delete from revogados where expira < ?", (int(time.time()),))
+            self.conexao.execute("insert or replace into revogados values (?, ?)", (self._resumo(token), int(expira)))
+
+    def __contains__(self, token):
+        with self.lock:
+            return self.conexao.execute("select 1 from revogados where resumo = ?", (self._resumo(token),)).fetchone() is not None
+
+@st.cache_resource
+def obter_tokens_revogados():
+    return TokensRevogados(os.environ.get("SESSOES_REVOGADAS", "sessoes_revogadas.sqlite3"))
+
+# IP do cliente; atrás do proxy, o último endereço de X-Forwarded-For (o que o proxy acrescentou)
+# Os anteriores vêm do próprio cliente e não servem para limitar tentativas
+def obter_ip():
+    encaminhado = st.context.headers.get("X-Forwarded-For")
+    if encaminhado:
+        return encaminhado.split(",")[-1].strip()
+    return st.context.ip_address or "desconhecido"
+
+# Navegador do cliente: o token só vale no mesmo navegador e IP em que foi gerado,
+# então um link copiado com ?sessao= não abre a sessão em outro aparelho
+def obter_cliente():
+    return f"{obter_ip()}|{st.context.headers.get('User-Agent', '')}"
+
+# Autentica fora da thread do script, respeitando os limites de tentativas
+# Retorna o nome do usuário ou None; gera LoginBloqueado se houver tentativas demais
+def autenticar(login, senha, ip):
+    limitador = obter_limitador()
+    if limitador.bloqueado(f"login:{login}", TENTATIVAS_POR_LOGIN) or limitador.bloqueado(f"ip:{ip}", TENTATIVAS_POR_IP):
+        raise LoginBloqueado("Muitas tentativas de login. Aguarde alguns minutos e tente novamente.")
+    with medir("login (bcrypt)"):
+        nome = obter_pool_autenticacao().verificar(autenticar_usuario, login, senha)
+    if nome:
+        limitador.limpar(f"login:{login}")
+    else:
+        limitador.registrar_falha(f"login:{login}")
+        limitador.registrar_falha(f"ip:{ip}")
+    return nome
+
+# Chave de assinatura dos tokens: somente SEGREDO_SESSAO, nunca uma chave que esteja no repositório
+# Sem ela (ou curta demais) retorna None e os tokens ficam desativados: é preciso entrar com a senha
+def _chave_assinatura():
+    segredo = os.environ.get("SEGREDO_SESSAO", "")
+    if len(segredo) < TAMANHO_MINIMO_SEGREDO:
+        return None
+    return hashlib.sha256(segredo.encode("utf-8")).digest()
+
+def _assinar(chave, conteudo, cliente):
+    return hmac.new(chave, f"{conteudo}|{cliente}".encode("utf-8"), hashlib.sha256).hexdigest()
+
+# Token de sessão assinado: login e validade, verificáveis sem consultar o banco nem o bcrypt
+# A assinatura inclui o cliente (IP e navegador), que não vai no token
+def gerar_token(login, cliente, validade=VALIDADE_SESSAO):
+    chave = _chave_assinatura()
+    if chave is None:
+        return None
+    login_codificado = base64.urlsafe_b64encode(login.encode("utf-8")).decode("ascii")
+    conteudo = f"{login_codificado}.{int(time.time() + validade)}"
+    return f"{conteudo}.{_assinar(chave, conteudo, cliente)}"
+
+# Retorna o login do token, ou None se ele for inválido, expirado, revogado ou de outro cliente
+def validar_token(token, cliente):
+    chave = _chave_assinatura()
+    if chave is None:
+        return None
+    try:
+        login_codificado, expira, assinatura = token.split(".")
+        conteudo = f"{login_codificado}.{expira}"
+        if not hmac.compare_digest(assinatura, _assinar(chave, conteudo, cliente)) or int(expira) < time.time():
+            return None
+        if token in obter_tokens_revogados():
+            return None
+        return base64.urlsafe_b64decode(login_codificado).decode("utf-8")
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+def revogar_token(token):
+    try:
+        expira = int(token.split(".")[1])
+    except (IndexError, ValueError):
+        return
+    if expira >= time.time():
+        obter_tokens_revogados().revogar(token, expira)
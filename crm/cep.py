@@ -0,0 +1,127 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Tempo máximo de espera pelo ViaCEP: (conexão, leitura) em segundos
+TIMEOUT_CEP = (2, 3)
+# CEPs quase nunca mudam: cada consulta vale por 30 dias
+VALIDADE_CEP = 30 * 24 * 3600
+# Quantidade de CEPs mantidos em memória (os demais ficam só no SQLite)
+TAMANHO_CACHE_CEP = 5000
+# Consultas simultâneas no preenchimento em lote
+CONSULTAS_SIMULTANEAS = 8
+
+# Normaliza o CEP para 8 dígitos (aceita "00000-000", "00.000-000" etc.)
+def normalizar_cep(cep):
+    cep = (cep or "").replace("-", "").replace(".", "").strip()
+    if len(cep) == 8 and cep.isdigit():
+        return cep
+    return None
+
+# Monta o endereço no mesmo formato usado pelo formulário
+def formatar_endereco(dados):
+    return f"{dados['logradouro']}, {dados['bairro']}, {dados['localidade']}/{dados['uf']}"
+
+# Serviço de consulta de CEP no ViaCEP
+# Reaproveita as conexões HTTP (sessão com pool), usa timeouts curtos e guarda as respostas
+# num cache LRU em memória com validade, persistido em SQLite para sobreviver a reinícios
+class ServicoCep:
+    def __init__(self, arquivo="cache_cep.sqlite3", tamanho=TAMANHO_CACHE_CEP, validade=VALIDADE_CEP):
+        self.tamanho = tamanho
+        self.validade = validade
+        self.memoria = OrderedDict()  # cep -> (consultado_em, dados ou None se o CEP não existe)
+        self.lock = threading.Lock()
+
+        self.sessao = requests.Session()
+        retentativas = Retry(total=1, backoff_factor=0.2, status_forcelist=[502, 503, 504])
+        self.sessao.mount("https://", HTTPAdapter(pool_maxsize=CONSULTAS_SIMULTANEAS, max_retries=retentativas))
+
+        self.banco = sqlite3.connect(arquivo, check_same_thread=False)
+        self.banco.execute("create table if not exists ceps (cep text primary key, dados text, consultado_em real)")
+        self.banco.commit()
+
+    def _ler_cache(self, cep):
+        agora = time.time()
+        with self.lock:
+            if cep in self.memoria:
+                consultado_em, dados = self.memoria[cep]
+                if agora - consultado_em < self.validade:
+                    self.memoria.move_to_end(cep)
+                    return True, dados
+                del self.memoria[cep]
+            linha = self.banco.execute("select dados, consultado_em from ceps where cep = ?", (cep,)).fetchone()
+        if linha and agora - linha[1] < self.validade:
+            dados = json.loads(linha[0]) if linha[0] else None
+            self._guardar_memoria(cep, linha[1], dados)
+            return True, dados
+        return False, None
+
+    def _guardar_memoria(self, cep, consultado_em, dados):
+        with self.lock:
+            self.memoria[cep] = (consultado_em, dados)
+            self.memoria.move_to_end(cep)
+            while len(self.memoria) > self.tamanho:
+                self.memoria.popitem(last=False)
+
+    def _guardar(self, cep, dados):
+        agora = time.time()
+        self._guardar_memoria(cep, agora, dados)
+        with self.lock:
+            self.banco.execute(
+                "insert or replace into ceps (cep, dados, consultado_em) values (?, ?, ?)",
+                (cep, json.dumps(dados) if dados else None, agora)
+            )
+            self.banco.commit()
+
+    # Retorna os dados do ViaCEP, ou None se o CEP for inválido ou não existir
+    # Falhas de rede (timeout, ViaCEP fora do ar) geram requests.RequestException e não são guardadas no cache
+    def consultar(self, cep):
+        cep = normalizar_cep(cep)
+        if cep is None:
+            return None
+        encontrado, dados = self._ler_cache(cep)
+        if encontrado:
+            return dados
+        response = self.sessao.get(f"https://viacep.com.br/ws/{cep}/json/", timeout=TIMEOUT_CEP)
+        if response.status_code == 400:
+            dados = None
+        else:
+            response.raise_for_status()
+            dados = response.json()
+            if "erro" in dados:
+                dados = None
+        self._guardar(cep, dados)
+        return dados
+
+    # Consulta vários CEPs em paralelo (CEPs repetidos são consultados uma vez só)
+    # Retorna {cep normalizado: dados ou None}; CEPs que falharam por erro de rede ficam de fora
+    def consultar_varios(self, ceps, simultaneas=CONSULTAS_SIMULTANEAS):
+        unicos = {normalizar_cep(cep) for cep in ceps} - {None}
+
+        def consultar(cep):
+            try:
+                return cep, self.consultar(cep), True
+            except requests.RequestException:
+                return cep, None, False
+
+        with ThreadPoolExecutor(max_workers=simultaneas) as executor:
+            resultados = list(executor.map(consultar, unicos))
+        return {cep: dados for cep, dados, sucesso in resultados if sucesso}
+
+# Serviço de CEP compartilhado entre as sessões (conexões reaproveitadas e cache persistente)
+@st.cache_resource
+def obter_servico_cep():
+    return ServicoCep(os.environ.get("CACHE_CEP", "cache_cep.sqlite3"))
+
+# Função para consultar CEP
+def consultar_cep(cep):
+    return obter_servico_cep().consultar(cep)
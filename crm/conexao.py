@@ -0,0 +1,47 @@
+import os
+
+import httpx
+import streamlit as st
+from dotenv import load_dotenv
+from postgrest.exceptions import APIError
+from supabase import ClientOptions, create_client
+
+from crm.metricas import GANCHOS_HTTP
+
+# Carrega as variáveis de ambiente (se estiver usando secrets.toml no Streamlit Cloud, elas já estarão disponíveis)
+load_dotenv()
+
+# Falhas de rede ou respostas de erro do Supabase (usadas onde o app segue funcionando sem a resposta)
+ERROS_SUPABASE = (httpx.HTTPError, APIError)
+
+# Obtém as credenciais do Supabase
+def obter_credenciais():
+    # Tenta obter credenciais dos secrets do Streamlit primeiro
+    try:
+        tem_secrets = "connections" in st.secrets and "supabase" in st.secrets.connections
+    except FileNotFoundError:
+        # Sem secrets.toml (por exemplo, scripts rodando fora do Streamlit)
+        tem_secrets = False
+    if tem_secrets:
+        url = st.secrets.connections.supabase.SUPABASE_URL
+        key = st.secrets.connections.supabase.SUPABASE_KEY
+    else:
+        # Caso contrário, usa variáveis de ambiente
+        url = os.environ.get("SUPABASE_URL")
+        key = os.environ.get("SUPABASE_KEY")
+
+    if not url or not key:
+        raise ValueError("Credenciais do Supabase não encontradas!")
+
+    return url, key
+
+# Cria um cliente novo (usado pelos scripts de linha de comando)
+def criar_cliente():
+    return create_client(*obter_credenciais())
+
+# Inicializa a conexão com o Supabase
+# No app, cada requisição passa pelos ganchos de métricas (tempo, bytes e linhas recebidos)
+@st.cache_resource
+def init_connection():
+    cliente_http = httpx.Client(timeout=120, follow_redirects=True, event_hooks=GANCHOS_HTTP)
+    return create_client(*obter_credenciais(), options=ClientOptions(httpx_client=cliente_http))
@@ -0,0 +1,84 @@
+import csv
+import io
+import tempfile
+
+import xlsxwriter
+
+from crm.metricas import medir
+
+# Colunas exportadas, na mesma ordem das tabelas do app
+COLUNAS_EXPORTACAO = ["Data", "Hora", "Nome", "Telefone", "Rua", "Numero", "CEP", "Fechou", "Valor", "Observacao", "Usuario"]
+COLUNA_VALOR = COLUNAS_EXPORTACAO.index("Valor")
+# Linhas lidas do Supabase por requisição (limite padrão do PostgREST)
+LOTE_EXPORTACAO = 1000
+
+FORMATOS = {
+    "XLSX": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "CSV": ("csv", "text/csv"),
+}
+
+# Lê as visitas do período em lotes ordenados por id, sem carregar tudo de uma vez
+def ler_em_lotes(supabase, data_inicio, data_fim, usuarios=None):
+    cursor = 0
+    while True:
+        consulta = (
+            supabase.table("agendamentos").select("id," + ",".join(COLUNAS_EXPORTACAO))
+            .gte("DataVisita", data_inicio.isoformat())
+            .lte("DataVisita", data_fim.isoformat())
+            .gt("id", cursor)
+        )
+        if usuarios is not None:
+            consulta = consulta.in_("Usuario", usuarios)
+        lote = consulta.order("id").limit(LOTE_EXPORTACAO).execute().data
+        if lote:
+            yield lote
+        if len(lote) < LOTE_EXPORTACAO:
+            return
+        cursor = lote[-1]["id"]
+
+# Grava a planilha linha a linha (constant_memory do xlsxwriter mantém só a linha atual em memória)
+def gerar_xlsx(lotes, arquivo):
+    planilha = xlsxwriter.Workbook(arquivo, {"constant_memory": True})
+    aba = planilha.add_worksheet("Visitas")
+    # "Valor" é gravado como número, com formato de moeda
+    moeda = planilha.add_format({"num_format": "R$ #,##0.00"})
+    aba.set_column(COLUNA_VALOR, COLUNA_VALOR, 14, moeda)
+    aba.write_row(0, 0, COLUNAS_EXPORTACAO)
+    linha = 1
+    for lote in lotes:
+        for visita in lote:
+            aba.write_row(linha, 0, [visita.get(coluna) for coluna in COLUNAS_EXPORTACAO])
+            linha += 1
+    planilha.close()
+
+# "Valor" no CSV com vírgula decimal e sem separador de milhar, como o Excel em português lê números
+def valor_csv(valor):
+    if valor is None or valor == "":
+        return ""
+    return f"{float(valor):.2f}".replace(".", ",")
+
+# CSV no padrão do Excel em português: separado por ";" e com vírgula decimal
+def gerar_csv(lotes, arquivo):
+    # utf-8-sig para o Excel abrir os acentos corretamente
+    texto = io.TextIOWrapper(arquivo, encoding="utf-8-sig", newline="")
+    escritor = csv.writer(texto, delimiter=";")
+    escritor.writerow(COLUNAS_EXPORTACAO)
+    for lote in lotes:
+        for visita in lote:
+            linha = [visita.get(coluna) for coluna in COLUNAS_EXPORTACAO]
+            linha[COLUNA_VALOR] = valor_csv(linha[COLUNA_VALOR])
+            escritor.writerow(linha)
+    texto.flush()
+    texto.detach()
+
+# Gera o arquivo de exportação num arquivo temporário em disco e o devolve pronto para leitura
+def exportar(supabase, formato, data_inicio, data_fim, usuarios=None):
+    arquivo = tempfile.TemporaryFile()
+    lotes = ler_em_lotes(supabase, data_inicio, data_fim, usuarios)
+    with medir(f"exportação {formato}"):
+        if formato == "XLSX":
+            gerar_xlsx(lotes, arquivo)
+        else:
+            gerar_csv(lotes, arquivo)
+    arquivo.seek(0)
+    return arquivo
@@ -0,0 +1,154 @@
+import json
+import logging
+import random
+import sqlite3
+import threading
+import time
+import uuid
+
+from postgrest.exceptions import APIError
+
+logger = logging.getLogger(__name__)
+
+# Visitas enviadas ao Supabase por requisição
+LOTE_ENVIO = 500
+# Espera entre tentativas após falha: dobra a cada erro, até o máximo (segundos)
+ESPERA_INICIAL = 2
+ESPERA_MAXIMA = 300
+
+# Erros que indicam falha temporária (rede, conexão do PostgREST com o banco, tempo esgotado, conflito
+# de transação, falta de recursos): o lote é tentado de novo mais tarde. Os demais erros do PostgREST
+# são recusas dos dados (valor fora do limite, coluna inválida...) e não adianta reenviar
+def erro_temporario(erro):
+    if not isinstance(erro, APIError):
+        return True
+    return not erro.code or erro.code.startswith(("PGRST0", "08", "40", "53", "57"))
+
+# Fila local (SQLite) de visitas a enviar ao Supabase
+# O formulário só grava na fila, o que é instantâneo; uma thread em segundo plano envia as visitas
+# em lote, com novas tentativas em caso de falha. A chave de idempotência evita duplicar uma visita
+# reenviada depois de uma resposta perdida. Visitas recusadas pelo banco saem da fila para a tabela
+# "rejeitadas", para não travar as seguintes, e o erro é mostrado ao vendedor
+class FilaEnvio:
+    def __init__(self, cliente, arquivo="fila_envio.sqlite3", ao_enviar=None):
+        self.cliente = cliente
+        self.ao_enviar = ao_enviar
+        self.lock = threading.Lock()
+        self.acordar = threading.Event()
+        self.banco = sqlite3.connect(arquivo, check_same_thread=False)
+        self.banco.execute(
+            "create table if not exists pendentes ("
+            "chave text primary key, usuario text, agendamento text, "
+            "tentativas integer default 0, proxima_tentativa real default 0, erro text)"
+        )
+        self.banco.execute(
+            "create table if not exists rejeitadas ("
+            "chave text primary key, usuario text, agendamento text, erro text, rejeitada_em real)"
+        )
+        self.banco.commit()
+        threading.Thread(target=self._enviar_sempre, name="fila-envio-agendamentos", daemon=True).start()
+
+    # Guarda a visita na fila e retorna a chave de idempotência
+    def enfileirar(self, agendamento):
+        agendamento = dict(agendamento)
+        agendamento.setdefault("ChaveIdempotencia", str(uuid.uuid4()))
+        with self.lock:
+            self.banco.execute(
+                "insert or ignore into pendentes (chave, usuario, agendamento) values (?, ?, ?)",
+                (agendamento["ChaveIdempotencia"], agendamento.get("Usuario"), json.dumps(agendamento))
+            )
+            self.banco.commit()
+        self.acordar.set()
+        return agendamento["ChaveIdempotencia"]
+
+    # Quantidade de visitas do usuário que ainda não chegaram ao Supabase
+    def pendentes(self, usuario):
+        with self.lock:
+            return self.banco.execute("select count(*) from pendentes where usuario = ?", (usuario,)).fetchone()[0]
+
+    # Visitas do usuário ainda na fila (para a agenda e a conferência de horário)
+    def listar(self, usuario):
+        with self.lock:
+            linhas = self.banco.execute("select agendamento from pendentes where usuario = ? order by rowid", (usuario,)).fetchall()
+        return [json.loads(linha[0]) for linha in linhas]
+
+    # Visitas do usuário recusadas pelo banco, com o erro de cada uma
+    def rejeitadas(self, usuario):
+        with self.lock:
+            linhas = self.banco.execute("select agendamento, erro from rejeitadas where usuario = ? order by rejeitada_em", (usuario,)).fetchall()
+        return [(json.loads(agendamento), erro) for agendamento, erro in linhas]
+
+    def descartar_rejeitadas(self, usuario):
+        with self.lock:
+            self.banco.execute("delete from rejeitadas where usuario = ?", (usuario,))
+            self.banco.commit()
+
+    def _rejeitar(self, chave, agendamento, erro):
+        mensagem = getattr(erro, "message", None) or str(erro)
+        logger.error("Visita %s recusada pelo Supabase: %s", chave, mensagem)
+        with self.lock:
+            self.banco.execute(
+                "insert or replace into rejeitadas (chave, usuario, agendamento, erro, rejeitada_em) values (?, ?, ?, ?, ?)",
+                (chave, json.loads(agendamento).get("Usuario"), agendamento, mensagem, time.time())
+            )
+            self.banco.execute("delete from pendentes where chave = ?", (chave,))
+            self.banco.commit()
+
+    # Envia as linhas num upsert e retorna quantas chegaram ao Supabase
+    # Se o banco recusar o lote, divide ao meio até isolar as linhas recusadas; falhas temporárias sobem
+    def _enviar_lote(self, linhas):
+        try:
+            self.cliente.table("agendamentos").upsert(
+                [json.loads(agendamento) for _, agendamento, _ in linhas],
+                on_conflict="ChaveIdempotencia",
+                ignore_duplicates=True,
+                returning="minimal"
+            ).execute()
+        except Exception as e:
+            if erro_temporario(e):
+                raise
+            if len(linhas) == 1:
+                self._rejeitar(linhas[0][0], linhas[0][1], e)
+                return 0
+            meio = len(linhas) // 2
+            return self._enviar_lote(linhas[:meio]) + self._enviar_lote(linhas[meio:])
+        with self.lock:
+            self.banco.executemany("delete from pendentes where chave = ?", [(chave,) for chave, _, _ in linhas])
+            self.banco.commit()
+        return len(linhas)
+
+    # Envia um lote das visitas cuja próxima tentativa já venceu; retorna quantas saíram da fila
+    def enviar(self):
+        with self.lock:
+            linhas = self.banco.execute(
+                "select chave, agendamento, tentativas from pendentes where proxima_tentativa <= ? order by rowid limit ?",
+                (time.time(), LOTE_ENVIO)
+            ).fetchall()
+        if not linhas:
+            return 0
+        try:
+            enviadas = self._enviar_lote(linhas)
+        except Exception as e:
+            logger.warning("Falha ao enviar %d visita(s); nova tentativa mais tarde: %s", len(linhas), e)
+            with self.lock:
+                for chave, _, tentativas in linhas:
+                    espera = min(ESPERA_INICIAL * 2 ** tentativas, ESPERA_MAXIMA) * random.uniform(0.8, 1.2)
+                    self.banco.execute(
+                        "update pendentes set tentativas = tentativas + 1, proxima_tentativa = ?, erro = ? where chave = ?",
+                        (time.time() + espera, str(e), chave)
+                    )
+                self.banco.commit()
+            return 0
+        if enviadas and self.ao_enviar:
+            self.ao_enviar()
+        return len(linhas)
+
+    def _enviar_sempre(self):
+        while True:
+            self.acordar.wait(timeout=ESPERA_INICIAL)
+            self.acordar.clear()
+            try:
+                while self.enviar() == LOTE_ENVIO:
+                    pass
+            except Exception:
+                logger.exception("Erro na fila de envio")
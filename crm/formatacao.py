@@ -0,0 +1,51 @@
+import re
+
+import pandas as pd
+
+# Função para formatar o telefone digitado: 10 ou 11 dígitos viram "(00) 0000-0000" / "(00) 00000-0000"
+def formatar_telefone(telefone):
+    return re.sub(r"(\d{2})(\d{4,5})(\d{4})", r"(\1) \2-\3", telefone)
+
+# Chave do cliente usada para achar visitas repetidas (mesma regra da coluna "ChaveCliente" no banco)
+# Telefones com e sem o 0 do DDD ou o código do país 55 geram a mesma chave: o 55 só sai quando sobram
+# 10 ou 11 dígitos (fixo ou celular com DDD), então o DDD 55 sem código do país fica. Sem telefone não há chave
+def chave_cliente(telefone, cep):
+    digitos = re.sub(r"^55(\d{10,11})$", r"\1", re.sub(r"\D", "", telefone or "").lstrip("0"))[-11:]
+    if not digitos:
+        return None
+    return digitos + ":" + re.sub(r"\D", "", cep or "")
+
+# Maior valor aceito pela coluna "Valor" (numeric(12, 2))
+VALOR_MAXIMO = 9999999999.99
+
+# Formatos aceitos: "1.234,56" / "1234,56" (vírgula decimal), "1234.56" (ponto decimal) e "1.234" (milhar)
+VALOR_VIRGULA = re.compile(r"(\d{1,3}(\.\d{3})+|\d+)(,\d{1,2})?")
+VALOR_PONTO = re.compile(r"\d+(\.\d{1,2})?")
+VALOR_MILHAR = re.compile(r"\d{1,3}(\.\d{3})+")
+
+# Função para converter o valor digitado no formulário ("R$ 1.234,56", "1234,56", "1234.56") em número
+# Retorna None para texto fora desses formatos (como "1,234.56", que viraria 1,23), negativo (o sinal é
+# mantido para que "-5" seja recusado, e não lido como 5) ou acima do limite da coluna
+def converter_valor(texto):
+    texto = re.sub(r"[^\d,.\-]", "", texto or "")
+    if not texto:
+        return None
+    if VALOR_VIRGULA.fullmatch(texto) and ("," in texto or VALOR_MILHAR.fullmatch(texto)):
+        numero = float(texto.replace(".", "").replace(",", "."))
+    elif VALOR_PONTO.fullmatch(texto):
+        numero = float(texto)
+    else:
+        return None
+    if numero > VALOR_MAXIMO:
+        return None
+    return round(numero, 2)
+
+# Função para formatar uma coluna de valores em real (vetorizada, sem chamada Python por linha)
+def formatar_moeda_br(valores):
+    numeros = pd.to_numeric(valores, errors="coerce").dropna()
+    centavos = (numeros.abs() * 100).round().astype("int64")
+    reais = (centavos // 100).astype(str).str.replace(r"\B(?=(\d{3})+(?!\d))", ".", regex=True)
+    # Sem sinal quando o valor arredondado é zero ("-0,004" vira "R$ 0,00")
+    prefixo = ((numeros < 0) & (centavos > 0)).map({True: "-R$ ", False: "R$ "})
+    texto = prefixo + reais + "," + (centavos % 100).astype(str).str.zfill(2)
+    return texto.reindex(valores.index).fillna("")
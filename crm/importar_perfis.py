@@ -0,0 +1,156 @@
+# Importa visitas antigas das planilhas perfilN.csv para a tabela agendamentos
+# Uso: python -m crm.importar_perfis --usuario Claudia perfil1.csv [perfil2.csv ...]
+# Os arquivos são lidos em streaming e enviados em lotes grandes (upsert); cada linha recebe uma
+# chave de idempotência derivada do seu conteúdo, então importar o mesmo arquivo de novo não duplica visitas
+# Linhas que o formulário recusaria (data, hora ou CEP inválidos, valor ilegível) não são importadas:
+# o resumo de cada arquivo lista a linha e o motivo
+import argparse
+import codecs
+import csv
+import re
+import unicodedata
+import uuid
+from datetime import datetime
+
+from crm.cep import normalizar_cep
+from crm.conexao import criar_cliente
+from crm.formatacao import converter_valor, formatar_telefone
+
+LOTE_IMPORTACAO = 1000
+# Linhas recusadas mostradas no resumo de cada arquivo (o total aparece sempre)
+RECUSADAS_EXIBIDAS = 20
+
+# Namespace das chaves de idempotência geradas na importação
+NAMESPACE_IMPORTACAO = uuid.UUID("6f1d3c1e-8a47-4f3b-9a8e-2c5b0e7d9f10")
+
+# Cabeçalhos das planilhas (sem acentos, só letras) -> colunas de agendamentos
+# A primeira coluna ("id", vazia ou só o BOM) é o índice da planilha antiga e é ignorada
+CABECALHOS = {
+    "data": "Data",
+    "hora": "Hora",
+    "nome": "Nome",
+    "telefone": "Telefone",
+    "fechou": "Fechou",
+    "valorr": "Valor",
+    "valor": "Valor",
+    "cep": "CEP",
+    "rua": "Rua",
+    "endereco": "Rua",
+    "observacao": "Observacao",
+    "usuario": "Usuario",
+}
+
+FORMATOS_DATA = ["%d/%m/%Y", "%d/%m/%y", "%Y-%m-%d"]
+FORMATOS_HORA = ["%H:%M", "%H:%M:%S"]
+
+# Detecta a codificação: BOM -> utf-8-sig; utf-8 válido -> utf-8; senão latin-1
+# A verificação é incremental, sem carregar o arquivo inteiro na memória
+def detectar_codificacao(caminho):
+    with open(caminho, "rb") as arquivo:
+        if arquivo.read(3) == codecs.BOM_UTF8:
+            return "utf-8-sig"
+        arquivo.seek(0)
+        decodificador = codecs.getincrementaldecoder("utf-8")()
+        try:
+            for bloco in iter(lambda: arquivo.read(1 << 16), b""):
+                decodificador.decode(bloco)
+            decodificador.decode(b"", final=True)
+        except UnicodeDecodeError:
+            return "latin-1"
+    return "utf-8"
+
+def normalizar_cabecalho(cabecalho):
+    sem_acentos = unicodedata.normalize("NFKD", cabecalho).encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"[^a-z]", "", sem_acentos.lower())
+
+def converter_data_hora(texto, formatos):
+    for formato in formatos:
+        try:
+            return datetime.strptime(texto.strip(), formato)
+        except ValueError:
+            pass
+    return None
+
+class LinhaInvalida(Exception):
+    pass
+
+# Converte uma linha da planilha no formato gravado pelo formulário
+# Gera LinhaInvalida com o motivo quando a linha não passaria nas validações do formulário
+def converter_linha(campos, usuario):
+    visita = {"Usuario": usuario}
+    visita.update(campos)
+    data = converter_data_hora(visita.get("Data") or "", FORMATOS_DATA)
+    hora = converter_data_hora(visita.get("Hora") or "", FORMATOS_HORA)
+    cep = normalizar_cep(visita.get("CEP"))
+    valor = converter_valor(visita.get("Valor"))
+    if not data:
+        raise LinhaInvalida(f"data inválida ({visita.get('Data', '')!r})")
+    if not hora:
+        raise LinhaInvalida(f"hora inválida ({visita.get('Hora', '')!r})")
+    if not cep:
+        raise LinhaInvalida(f"CEP inválido ({visita.get('CEP', '')!r})")
+    if visita.get("Valor") and valor is None:
+        raise LinhaInvalida(f"valor inválido ({visita['Valor']!r})")
+
+    visita["Telefone"] = formatar_telefone(visita.get("Telefone") or "")
+    visita["CEP"] = "{}-{}".format(cep[:5], cep[5:])
+    visita["Valor"] = valor
+    visita["Data"] = data.strftime("%d/%m/%Y")
+    visita["DataVisita"] = data.date().isoformat()
+    visita["Hora"] = hora.strftime("%H:%M")
+    visita["HoraVisita"] = hora.time().isoformat(timespec="minutes")
+
+    conteudo = "|".join(f"{chave}={visita.get(chave)}" for chave in sorted(visita))
+    visita["ChaveIdempotencia"] = str(uuid.uuid5(NAMESPACE_IMPORTACAO, conteudo))
+    return visita
+
+# Lê a planilha linha a linha, já convertida para o esquema de agendamentos
+# As linhas inválidas vão para recusadas como (número da linha no arquivo, motivo)
+def ler_planilha(caminho, usuario, recusadas):
+    with open(caminho, encoding=detectar_codificacao(caminho), newline="") as arquivo:
+        primeira_linha = arquivo.readline()
+        delimitador = ";" if primeira_linha.count(";") > primeira_linha.count(",") else ","
+        cabecalhos = next(csv.reader([primeira_linha], delimiter=delimitador))
+        colunas = [CABECALHOS.get(normalizar_cabecalho(cabecalho)) for cabecalho in cabecalhos]
+        leitor = csv.reader(arquivo, delimiter=delimitador)
+        for linha in leitor:
+            campos = {coluna: valor.strip() for coluna, valor in zip(colunas, linha) if coluna and valor.strip()}
+            if not campos:
+                continue
+            try:
+                yield converter_linha(campos, usuario)
+            except LinhaInvalida as e:
+                # +1 pelo cabeçalho, lido fora do leitor
+                recusadas.append((leitor.line_num + 1, str(e)))
+
+def enviar_lote(supabase, lote):
+    supabase.table("agendamentos").upsert(
+        lote, on_conflict="ChaveIdempotencia", ignore_duplicates=True, returning="minimal"
+    ).execute()
+
+def main():
+    parser = argparse.ArgumentParser(description="Importa planilhas perfilN.csv para agendamentos")
+    parser.add_argument("arquivos", nargs="+")
+    parser.add_argument("--usuario", required=True, help="login do vendedor dono das visitas")
+    args = parser.parse_args()
+
+    supabase = criar_cliente()
+    for caminho in args.arquivos:
+        lote, total, recusadas = [], 0, []
+        for visita in ler_planilha(caminho, args.usuario, recusadas):
+            lote.append(visita)
+            if len(lote) == LOTE_IMPORTACAO:
+                enviar_lote(supabase, lote)
+                total += len(lote)
+                lote = []
+        if lote:
+            enviar_lote(supabase, lote)
+            total += len(lote)
+        print(f"{caminho}: {total} visitas importadas, {len(recusadas)} linhas recusadas")
+        for numero, motivo in recusadas[:RECUSADAS_EXIBIDAS]:
+            print(f"  linha {numero}: {motivo}")
+        if len(recusadas) > RECUSADAS_EXIBIDAS:
+            print(f"  ... e mais {len(recusadas) - RECUSADAS_EXIBIDAS}")
+
+if __name__ == "__main__":
+    main()
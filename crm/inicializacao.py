@@ -0,0 +1,29 @@
+import streamlit as st
+from postgrest.exceptions import APIError
+
+from crm.agendamentos import COLUNAS_CACHE
+from crm.conexao import init_connection
+from crm.resumos import obter_resumos
+from crm.usuarios import inserir_usuarios_iniciais
+
+# Colunas usadas fora do cache: chave da fila de envio (007), do histórico do cliente (008) e da busca (010)
+# Sem elas o envio da fila falha com um erro definitivo e as visitas iriam todas para as recusadas
+COLUNAS_MIGRACOES = "ChaveIdempotencia,ChaveCliente,TextoBusca"
+
+# Confere se as colunas criadas pelas migrações de sql/ existem (consulta sem trazer linhas)
+def verificar_esquema(supabase):
+    try:
+        supabase.table("agendamentos").select(COLUNAS_CACHE + "," + COLUNAS_MIGRACOES).limit(0).execute()
+        supabase.table("usuarios").select("login,papel,equipe,atualizado_em").limit(0).execute()
+    except APIError as e:
+        raise RuntimeError(f"Banco de dados desatualizado: aplique as migrações da pasta sql/ ({e.message})") from e
+
+# Preparação feita uma única vez por processo, e não a cada rerun: cria os usuários
+# iniciais se a tabela estiver vazia, confere o esquema do banco e inicia os resumos diários
+@st.cache_resource
+def inicializar():
+    supabase = init_connection()
+    verificar_esquema(supabase)
+    inserir_usuarios_iniciais(supabase)
+    obter_resumos()
+    return supabase
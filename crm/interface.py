@@ -0,0 +1,410 @@
+from datetime import datetime, timedelta
+from functools import partial
+
+import pandas as pd
+import streamlit as st
+
+from crm.agendamentos import DURACAO_VISITA, TAMANHO_PAGINA, buscar_conflitos, buscar_historico_cliente, buscar_visitas, contar_pendentes, descartar_rejeitadas, ler_agenda, ler_agendamentos_filtrados, ler_agendamentos_por_usuario, ler_indicadores, listar_pendentes, listar_rejeitadas
+from crm.autenticacao import LoginBloqueado, VerificacaoIndisponivel, autenticar, gerar_token, obter_cliente, obter_ip, revogar_token, validar_token
+from crm.conexao import ERROS_SUPABASE, init_connection
+from crm.exportacao import FORMATOS, exportar
+from crm.formatacao import chave_cliente, formatar_moeda_br
+from crm.metricas import medir
+from crm.resumos import obter_resumos
+from crm.roteiro import montar_roteiro, obter_geocodificador
+from crm.tempo_real import obter_assinante_agendamentos
+from crm.usuarios import obter_diretorio, vendedores_da_equipe
+
+# Inicializar Session State para login e horário selecionado
+def iniciar_sessao():
+    if 'autenticado' not in st.session_state:
+        st.session_state.autenticado = False
+    if 'usuario' not in st.session_state:
+        st.session_state.usuario = None
+    if 'token_sessao' not in st.session_state:
+        st.session_state.token_sessao = None
+    if 'hora_selecionada' not in st.session_state:
+        st.session_state.hora_selecionada = (datetime.now() - timedelta(hours=3)).time()
+    # Recarregar a página mantém o login pelo token da URL (sem bcrypt nem consulta ao banco)
+    if not st.session_state.autenticado and "sessao" in st.query_params:
+        login = validar_token(st.query_params["sessao"], obter_cliente())
+        if login:
+            st.session_state.autenticado = True
+            st.session_state.usuario = login
+            st.session_state.token_sessao = st.query_params["sessao"]
+        else:
+            del st.query_params["sessao"]
+
+# Interface de Login
+def tela_login():
+    st.title("Login")
+    login_input = st.text_input("Login")
+    senha_input = st.text_input("Senha", type="password")
+    if st.button("Entrar"):
+        try:
+            nome_usuario = autenticar(login_input, senha_input, obter_ip())
+        except (LoginBloqueado, VerificacaoIndisponivel) as e:
+            st.error(str(e))
+            return
+        if nome_usuario:
+            st.session_state.autenticado = True
+            st.session_state.usuario = login_input  # Armazena o login para uso posterior
+            token = gerar_token(login_input, obter_cliente())
+            if token:
+                st.query_params["sessao"] = token
+                st.session_state.token_sessao = token
+            st.success(f"Bem-vindo(a), {nome_usuario}!")
+        else:
+            st.error("Login ou senha inválidos.")
+
+# Função para ler as visitas já carregadas de uma tabela
+# A sessão guarda só o menor id exibido; as linhas vêm sempre do cache compartilhado (já atualizado)
+def carregar_visitas(chave, filtros, ler_pagina):
+    estado = st.session_state.get(chave)
+    if estado is None or estado["filtros"] != filtros or estado["menor_id"] is None:
+        visitas = ler_pagina()
+        estado = {
+            "filtros": filtros,
+            "menor_id": int(visitas["id"].min()) if not visitas.empty else None,
+            "tem_mais": len(visitas) == TAMANHO_PAGINA
+        }
+        st.session_state[chave] = estado
+    else:
+        visitas = ler_pagina(depois_de_id=estado["menor_id"] - 1)
+    return visitas, estado
+
+# Função para buscar a próxima página de visitas (botão "Carregar mais")
+def carregar_mais_visitas(chave, ler_pagina):
+    estado = st.session_state[chave]
+    pagina = ler_pagina(antes_de_id=estado["menor_id"])
+    if not pagina.empty:
+        estado["menor_id"] = int(pagina["id"].min())
+    estado["tem_mais"] = len(pagina) == TAMANHO_PAGINA
+
+# Busca de visitas por texto; cada página vem do Supabase já ordenada por relevância
+# A sessão guarda só quantas páginas foram abertas; as páginas ficam no cache de buscar_visitas
+def exibir_busca(chave, vendedores, colunas_ordenadas=None):
+    termo = st.text_input("Buscar visitas", placeholder="Nome do cliente, endereço ou observação", key=f"{chave}_termo").strip()
+    if not termo:
+        return
+    vendedores = tuple(vendedores)
+    if st.session_state.get(f"{chave}_filtros") != (termo, vendedores):
+        st.session_state[f"{chave}_filtros"] = (termo, vendedores)
+        st.session_state[f"{chave}_paginas"] = 1
+    paginas, tem_mais = [], False
+    for pagina in range(st.session_state[f"{chave}_paginas"]):
+        resultados, tem_mais = buscar_visitas(termo, vendedores, pagina * TAMANHO_PAGINA)
+        paginas.append(resultados)
+    resultados = pd.concat(paginas, ignore_index=True)
+    if resultados.empty:
+        st.write("Nenhuma visita encontrada para a busca.")
+        return
+    exibir_tabela_visitas(resultados, colunas_ordenadas)
+    if tem_mais:
+        st.button("Mais resultados", key=f"{chave}_mais", on_click=abrir_proxima_pagina, args=(f"{chave}_paginas",))
+
+def abrir_proxima_pagina(chave):
+    st.session_state[chave] += 1
+
+# Confere se o cliente (telefone + CEP) já tem visitas registradas
+# Retorna o aviso que exige confirmação (visita do mesmo cliente no mesmo dia) ou None
+# Sem conexão com o Supabase a conferência é pulada: a visita vai para a fila de envio mesmo assim
+def verificar_cliente_repetido(agendamento):
+    chave = chave_cliente(agendamento["Telefone"], agendamento["CEP"])
+    try:
+        historico = buscar_historico_cliente(chave, limite=5)
+    except ERROS_SUPABASE:
+        st.info("Sem conexão: não foi possível conferir as visitas anteriores deste cliente.")
+        return None
+    if historico.empty:
+        return None
+    anteriores = ", ".join(historico["Data"].fillna("") + " (" + historico["Usuario"].fillna("") + ")")
+    if (historico["DataVisita"] == agendamento["DataVisita"]).any():
+        return f"Este cliente já tem visita registrada neste dia: {anteriores}."
+    st.warning(f"Cliente já visitado antes: {anteriores}")
+    return None
+
+# Confere se o vendedor já tem visita marcada perto do mesmo horário; retorna o aviso ou None
+def verificar_horario_livre(agendamento):
+    conflitos = buscar_conflitos(agendamento["Usuario"], agendamento["DataVisita"], agendamento["HoraVisita"])
+    if conflitos.empty:
+        return None
+    marcadas = ", ".join(conflitos["HoraVisita"].fillna("").str[:5] + " " + conflitos["Nome"].fillna(""))
+    return f"Você já tem visita a menos de {DURACAO_VISITA} minutos deste horário: {marcadas}."
+
+# Confere, antes de salvar, cliente repetido no mesmo dia e conflito de horário
+# As duas conferências rodam a cada envio; com algum aviso, a visita só é salva depois de o usuário
+# clicar em "Marcar" de novo (uma única confirmação para os dois avisos)
+def confirmar_agendamento(agendamento):
+    avisos = [aviso for aviso in (verificar_cliente_repetido(agendamento), verificar_horario_livre(agendamento)) if aviso]
+    if not avisos:
+        return True
+    confirmacao = (
+        agendamento["Usuario"], chave_cliente(agendamento["Telefone"], agendamento["CEP"]),
+        agendamento["DataVisita"], agendamento["HoraVisita"]
+    )
+    if st.session_state.get("confirmar_agendamento") == confirmacao:
+        st.session_state.confirmar_agendamento = None
+        return True
+    st.session_state.confirmar_agendamento = confirmacao
+    st.warning(" ".join(avisos) + " Clique em \"Marcar\" de novo para registrar mesmo assim.")
+    return False
+
+# Agenda da semana: uma coluna por dia e uma linha por horário
+# Lê do Supabase só a semana exibida; para o próprio vendedor, inclui as visitas ainda na fila de envio
+def exibir_agenda_semanal(chave, vendedores, mostrar_vendedor=False):
+    with st.expander("Agenda da semana"):
+        dia = st.date_input("Semana de", value=datetime.now().date(), format="DD/MM/YYYY", key=f"{chave}_semana")
+        inicio = dia - timedelta(days=dia.weekday())
+        fim = inicio + timedelta(days=6)
+        agenda = ler_agenda(tuple(vendedores), inicio, fim)
+        if not mostrar_vendedor:
+            pendentes = listar_pendentes(vendedores[0])
+            pendentes = pendentes[
+                (pendentes["DataVisita"] >= inicio.isoformat()) & (pendentes["DataVisita"] <= fim.isoformat())
+                & ~pendentes["ChaveIdempotencia"].isin(agenda["ChaveIdempotencia"])
+            ]
+            if not pendentes.empty:
+                pendentes = pendentes.assign(Nome=pendentes["Nome"].fillna("") + " (enviando)")
+                agenda = pd.concat([agenda, pendentes], ignore_index=True)
+        if agenda.empty:
+            st.write("Nenhuma visita nesta semana.")
+            return
+        dias = [inicio + timedelta(days=indice) for indice in range(7)]
+        nomes_dias = {dia.isoformat(): f"{['Seg', 'Ter', 'Qua', 'Qui', 'Sex', 'Sáb', 'Dom'][dia.weekday()]} {dia:%d/%m}" for dia in dias}
+        agenda = agenda.assign(
+            Horario=agenda["HoraVisita"].fillna("").str[:5],
+            Dia=agenda["DataVisita"].map(nomes_dias),
+            Visita=agenda["Nome"].fillna("") + (" (" + agenda["Usuario"] + ")" if mostrar_vendedor else "")
+        )
+        # Visitas no mesmo horário aparecem juntas na mesma célula
+        calendario = agenda.pivot_table(index="Horario", columns="Dia", values="Visita", aggfunc=" | ".join)
+        calendario = calendario.reindex(columns=list(nomes_dias.values())).rename_axis(index="Horário", columns=None)
+        st.dataframe(calendario.fillna(""))
+
+# Histórico de visitas de um cliente, para os supervisores (só as visitas da equipe)
+def exibir_historico_cliente(equipe):
+    with st.expander("Histórico do cliente"):
+        col1, col2 = st.columns(2)
+        telefone = col1.text_input("Telefone do cliente", key="historico_telefone")
+        cep = col2.text_input("CEP do cliente", key="historico_cep")
+        if not telefone:
+            return
+        historico = buscar_historico_cliente(chave_cliente(telefone, cep), usuarios=equipe)
+        if historico.empty:
+            st.write("Nenhuma visita encontrada para este cliente.")
+        else:
+            exibir_tabela_visitas(historico.drop(columns=["DataVisita"]))
+
+# Função para exibir uma tabela de visitas (valor formatado em real e colunas na ordem pedida)
+def exibir_tabela_visitas(agendamentos, colunas_ordenadas=None):
+    if "Valor" in agendamentos.columns:
+        with medir("formatar moeda"):
+            agendamentos["Valor"] = formatar_moeda_br(agendamentos["Valor"])
+    df_display = agendamentos.drop(columns=["id"], errors='ignore')
+    if colunas_ordenadas:
+        # Usar apenas as colunas que existem no dataframe
+        colunas_existentes = [col for col in colunas_ordenadas if col in df_display.columns]
+        df_display = df_display[colunas_existentes]
+    st.dataframe(df_display)
+
+# Tela dos supervisores: acompanhamento das visitas com filtros
+def tela_acompanhamento(colunas_ordenadas=None, indicadores=False):
+    st.title("Acompanhamento de Visitas")
+
+    # Vendedores da equipe do supervisor (diretório de usuários do banco)
+    equipe = vendedores_da_equipe(st.session_state.usuario)
+
+    # Filtros: data e vendedor
+    col1, col2 = st.columns(2)
+    with col1:
+        filtro_data = st.date_input("Filtrar por Data", value=datetime.now().date())
+    with col2:
+        filtro_vendedor = st.selectbox("Filtrar por Vendedor", options=["Todos"] + equipe)
+    vendedores = equipe if filtro_vendedor == "Todos" else [filtro_vendedor]
+
+    exibir_busca("busca_supervisor", vendedores, colunas_ordenadas)
+
+    # Lê somente os agendamentos do dia e vendedor(es) selecionados
+    ler_pagina = partial(ler_agendamentos_filtrados, filtro_data, vendedores)
+    agendamentos, estado_visitas = carregar_visitas("visitas_supervisor", (filtro_data, tuple(vendedores)), ler_pagina)
+    # Novas visitas do dia/vendedores filtrados chegam pelo realtime e atualizam a tela sozinhas
+    obter_assinante_agendamentos().registrar_sessao(vendedores, filtro_data)
+
+    if not agendamentos.empty:
+        st.markdown("### Visitas")
+        exibir_tabela_visitas(agendamentos, colunas_ordenadas)
+        if estado_visitas["tem_mais"]:
+            st.button("Carregar mais", key="mais_visitas_supervisor", on_click=carregar_mais_visitas, args=("visitas_supervisor", ler_pagina))
+    else:
+        st.write("Nenhuma visita encontrada para os filtros selecionados.")
+
+    if filtro_vendedor != "Todos":
+        exibir_roteiro("roteiro_supervisor", filtro_vendedor, filtro_data)
+
+    exibir_agenda_semanal("agenda_supervisor", vendedores, mostrar_vendedor=True)
+
+    exibir_relatorio_diario(filtro_data, vendedores)
+
+    exibir_historico_cliente(equipe)
+
+    exibir_exportacao("exportacao_supervisor", equipe=equipe)
+
+    if indicadores:
+        exibir_indicadores(vendedores)
+
+# Lista das visitas do vendedor logado, abaixo do formulário de cadastro
+def exibir_visitas_usuario(colunas_ordenadas=None):
+    usuario = st.session_state.usuario
+    ler_pagina = partial(ler_agendamentos_por_usuario, usuario)
+    agendamentos, estado_visitas = carregar_visitas("visitas_usuario", usuario, ler_pagina)
+    obter_assinante_agendamentos().registrar_sessao([usuario])
+    pendentes = contar_pendentes(usuario)
+    if pendentes:
+        st.info(f"{pendentes} visita(s) aguardando envio. Elas serão enviadas automaticamente assim que a conexão permitir.")
+    rejeitadas = listar_rejeitadas(usuario)
+    if rejeitadas:
+        recusadas = "; ".join(f"{agendamento.get('Nome')} ({agendamento.get('Data')} {agendamento.get('Hora')}): {erro}" for agendamento, erro in rejeitadas)
+        st.error(f"Visita(s) recusada(s) pelo banco e não salva(s): {recusadas}. Confira os dados e cadastre de novo.")
+        st.button("Dispensar aviso", key="dispensar_rejeitadas", on_click=descartar_rejeitadas, args=(usuario,))
+    exibir_busca("busca_usuario", [usuario], colunas_ordenadas)
+    if not agendamentos.empty:
+        st.markdown("### Suas Visitas")
+        exibir_tabela_visitas(agendamentos, colunas_ordenadas)
+        if estado_visitas["tem_mais"]:
+            st.button("Carregar mais", key="mais_visitas_usuario", on_click=carregar_mais_visitas, args=("visitas_usuario", ler_pagina))
+    else:
+        st.write("Nenhua visita realizada até o momento.")
+
+    exibir_agenda_semanal("agenda_usuario", [usuario])
+
+    exibir_roteiro("roteiro_usuario", usuario)
+
+    exibir_exportacao("exportacao_usuario", usuario=usuario)
+
+# Roteiro do dia: visitas do vendedor na ordem de menor deslocamento, saindo da primeira do dia
+# Sem data, o próprio vendedor escolhe o dia dentro do expander
+def exibir_roteiro(chave, usuario, data=None):
+    with st.expander("Roteiro do dia"):
+        if data is None:
+            data = st.date_input("Dia do roteiro", value=datetime.now().date(), format="DD/MM/YYYY", key=f"{chave}_data")
+        visitas = ler_agendamentos_filtrados(data, [usuario], depois_de_id=0)
+        if visitas.empty:
+            st.write("Nenhuma visita neste dia.")
+            return
+        roteiro, nao_localizadas, distancia = montar_roteiro(visitas, obter_geocodificador())
+        if not roteiro.empty:
+            st.caption(f"{len(roteiro)} parada(s), cerca de {distancia:.1f} km em linha reta")
+            roteiro.index = roteiro.index + 1
+            st.dataframe(roteiro[["Hora", "Nome", "Rua", "Numero", "CEP", "Telefone"]])
+            st.map(roteiro[["latitude", "longitude"]])
+        if not nao_localizadas.empty:
+            st.warning("Visitas sem localização (CEP fora da base de endereços): " + ", ".join(nao_localizadas["Nome"].fillna("")))
+
+# Relatório do dia filtrado: resumo por vendedor e planilha da equipe
+# Dias encerrados vêm prontos dos resumos diários; o dia de hoje é resumido na hora a partir do cache
+def exibir_relatorio_diario(data, vendedores):
+    with st.expander("Relatório do dia"):
+        resumo = obter_resumos().resumo(data, vendedores)
+        if resumo.empty:
+            st.write("Nenhuma visita neste dia.")
+            return
+        resumo["valor"] = formatar_moeda_br(resumo["valor"])
+        st.dataframe(resumo.rename(columns={
+            "vendedor": "Vendedor", "visitas": "Visitas", "fechadas": "Fechadas", "valor": "Valor"
+        }), hide_index=True)
+        equipe = obter_diretorio().nome_equipe(st.session_state.usuario)
+        planilha = obter_resumos().planilha(data, equipe)
+        if planilha:
+            dados = partial(open, planilha, "rb")
+        else:
+            dados = partial(exportar, init_connection(), "XLSX", data, data, vendedores_da_equipe(st.session_state.usuario))
+        st.download_button(
+            label="Download da planilha do dia (equipe)",
+            data=dados,
+            file_name=f"agendamentos_{data:%Y%m%d}.xlsx",
+            mime=FORMATOS["XLSX"][1],
+            key="relatorio_diario_download"
+        )
+
+# Função para exibir o painel de indicadores dos supervisores
+def exibir_indicadores(vendedores):
+    st.markdown("### Indicadores")
+    hoje = datetime.now().date()
+    periodo = st.date_input("Período dos indicadores", value=(hoje - timedelta(days=29), hoje), format="DD/MM/YYYY")
+    if len(periodo) != 2:
+        st.info("Selecione a data inicial e a data final.")
+        return
+    indicadores = ler_indicadores(periodo[0], periodo[1], tuple(vendedores))
+    por_vendedor = pd.DataFrame(indicadores["por_vendedor"], columns=["vendedor", "visitas", "fechadas", "valor"])
+    if por_vendedor.empty:
+        st.write("Nenhuma visita no período selecionado.")
+        return
+
+    visitas = int(por_vendedor["visitas"].sum())
+    fechadas = int(por_vendedor["fechadas"].sum())
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Visitas", visitas)
+    col2.metric("Fechadas", fechadas)
+    col3.metric("Conversão", f"{fechadas / visitas:.0%}")
+    col4.metric("Valor total", formatar_moeda_br(pd.Series([por_vendedor["valor"].sum()]))[0])
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown("**Por vendedor**")
+        por_vendedor["conversao"] = (por_vendedor["fechadas"] / por_vendedor["visitas"]).map("{:.0%}".format)
+        por_vendedor["valor"] = formatar_moeda_br(por_vendedor["valor"])
+        st.dataframe(por_vendedor.rename(columns={
+            "vendedor": "Vendedor", "visitas": "Visitas", "fechadas": "Fechadas", "valor": "Valor", "conversao": "Conversão"
+        }), hide_index=True)
+    with col2:
+        st.markdown("**Por situação**")
+        por_fechou = pd.DataFrame(indicadores["por_fechou"], columns=["fechou", "visitas"])
+        st.dataframe(por_fechou.rename(columns={"fechou": "Fechou", "visitas": "Visitas"}), hide_index=True)
+
+    st.markdown("**Visitas por dia**")
+    por_dia = pd.DataFrame(indicadores["por_dia"], columns=["dia", "visitas"])
+    st.bar_chart(por_dia.set_index("dia")["visitas"])
+    st.markdown("**Visitas por semana**")
+    por_semana = pd.DataFrame(indicadores["por_semana"], columns=["semana", "visitas"])
+    st.bar_chart(por_semana.set_index("semana")["visitas"])
+
+# Função para exibir a exportação de visitas por período
+# O arquivo só é gerado quando o botão de download é clicado, lendo o Supabase em lotes
+# Com equipe (supervisores), escolhe entre os vendedores da equipe; senão exporta só as visitas do usuário
+def exibir_exportacao(chave, equipe=None, usuario=None):
+    with st.expander("Exportar visitas"):
+        col1, col2, col3 = st.columns(3)
+        hoje = datetime.now().date()
+        periodo = col1.date_input("Período", value=(hoje.replace(day=1), hoje), format="DD/MM/YYYY", key=f"{chave}_periodo")
+        if equipe is not None:
+            vendedor = col2.selectbox("Vendedor", options=["Todos"] + equipe, key=f"{chave}_vendedor")
+            usuarios = equipe if vendedor == "Todos" else [vendedor]
+        else:
+            usuarios = [usuario]
+        formato = col3.radio("Formato", list(FORMATOS), horizontal=True, key=f"{chave}_formato")
+        if len(periodo) != 2:
+            st.info("Selecione a data inicial e a data final.")
+            return
+        data_inicio, data_fim = periodo
+        extensao, mime = FORMATOS[formato]
+        st.download_button(
+            label=f"Download como {formato}",
+            data=partial(exportar, init_connection(), formato, data_inicio, data_fim, usuarios),
+            file_name=f"agendamentos_{data_inicio:%Y%m%d}_{data_fim:%Y%m%d}.{extensao}",
+            mime=mime,
+            key=f"{chave}_download"
+        )
+
+def botao_sair():
+    if st.button("Sair"):
+        st.session_state.autenticado = False
+        st.session_state.usuario = None
+        # O token guardado na sessão é o que vale: a URL do servidor pode ter perdido o parâmetro num rerun
+        if st.session_state.get("token_sessao"):
+            revogar_token(st.session_state.token_sessao)
+            st.session_state.token_sessao = None
+        if "sessao" in st.query_params:
+            del st.query_params["sessao"]
+        st.info("Você saiu da aplicação.")
+        st.rerun()
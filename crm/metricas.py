@@ -0,0 +1,189 @@
+import functools
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+logger = logging.getLogger(__name__)
+
+# Limites (em segundos) das faixas do histograma de duração
+FAIXAS_DURACAO = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Intervalo entre duas gravações do arquivo de métricas
+INTERVALO_EXPORTACAO = 15
+
+# Métricas do processo: duração das etapas e das chamadas ao Supabase, bytes e linhas recebidos
+# e acertos/faltas dos caches. Gravadas periodicamente num arquivo no formato do Prometheus
+# (lido pelo textfile collector do node_exporter)
+class Metricas:
+    def __init__(self, arquivo=None, intervalo=INTERVALO_EXPORTACAO):
+        self.arquivo = arquivo
+        self.intervalo = intervalo
+        self.duracoes = {}  # etapa -> [contagem por faixa..., total de chamadas, soma, máximo]
+        self.contadores = defaultdict(float)  # (nome, rótulos) -> valor
+        self.lock = threading.Lock()
+        if arquivo:
+            threading.Thread(target=self._exportar_sempre, daemon=True, name="metricas").start()
+
+    def registrar_duracao(self, etapa, segundos):
+        with self.lock:
+            duracao = self.duracoes.setdefault(etapa, [0] * len(FAIXAS_DURACAO) + [0, 0.0, 0.0])
+            for indice, limite in enumerate(FAIXAS_DURACAO):
+                if segundos <= limite:
+                    duracao[indice] += 1
+            duracao[-3] += 1
+            duracao[-2] += segundos
+            duracao[-1] = max(duracao[-1], segundos)
+
+    def somar(self, nome, valor=1, **rotulos):
+        with self.lock:
+            self.contadores[(nome, tuple(sorted(rotulos.items())))] += valor
+
+    # Resumo das durações: etapa, chamadas, média e máximo (em milissegundos)
+    def resumo(self):
+        with self.lock:
+            return [
+                (etapa, duracao[-3], duracao[-2] / duracao[-3] * 1000, duracao[-1] * 1000)
+                for etapa, duracao in sorted(self.duracoes.items())
+            ]
+
+    def texto_prometheus(self):
+        linhas = [
+            "# HELP crm_duracao_segundos Duração das etapas do app e das chamadas ao Supabase",
+            "# TYPE crm_duracao_segundos histogram",
+        ]
+        with self.lock:
+            for etapa, duracao in sorted(self.duracoes.items()):
+                rotulo = etapa.replace("\\", "\\\\").replace('"', '\\"')
+                for limite, quantidade in zip(FAIXAS_DURACAO, duracao):
+                    linhas.append(f'crm_duracao_segundos_bucket{{etapa="{rotulo}",le="{limite}"}} {quantidade}')
+                linhas.append(f'crm_duracao_segundos_bucket{{etapa="{rotulo}",le="+Inf"}} {duracao[-3]}')
+                linhas.append(f'crm_duracao_segundos_sum{{etapa="{rotulo}"}} {duracao[-2]:.6f}')
+                linhas.append(f'crm_duracao_segundos_count{{etapa="{rotulo}"}} {duracao[-3]}')
+            nomes = sorted({nome for nome, _ in self.contadores})
+            for nome in nomes:
+                linhas.append(f"# TYPE crm_{nome} counter")
+                for (nome_contador, rotulos), valor in sorted(self.contadores.items()):
+                    if nome_contador == nome:
+                        texto_rotulos = ",".join(f'{chave}="{valor_rotulo}"' for chave, valor_rotulo in rotulos)
+                        linhas.append(f"crm_{nome}{{{texto_rotulos}}} {valor:g}")
+        return "\n".join(linhas) + "\n"
+
+    # Grava o arquivo por inteiro e troca de uma vez (quem lê nunca vê o arquivo pela metade)
+    def exportar(self):
+        temporario = self.arquivo + ".tmp"
+        with open(temporario, "w", encoding="utf-8") as arquivo:
+            arquivo.write(self.texto_prometheus())
+        os.replace(temporario, self.arquivo)
+
+    def _exportar_sempre(self):
+        while True:
+            time.sleep(self.intervalo)
+            try:
+                self.exportar()
+            except OSError:
+                logger.exception("Falha ao gravar as métricas em %s", self.arquivo)
+
+# Métricas compartilhadas por todas as sessões do processo
+@st.cache_resource
+def obter_metricas():
+    return Metricas(os.environ.get("METRICAS_ARQUIVO", "metricas.prom"))
+
+# Guarda a medição também na lista do rerun atual (só na thread do script; as threads de fundo não têm sessão)
+def _registrar_no_rerun(etapa, segundos, detalhe=""):
+    if get_script_run_ctx(suppress_warning=True) is not None and "metricas_rerun" in st.session_state:
+        st.session_state.metricas_rerun.append((etapa, segundos * 1000, detalhe))
+
+def registrar(etapa, segundos, detalhe=""):
+    obter_metricas().registrar_duracao(etapa, segundos)
+    _registrar_no_rerun(etapa, segundos, detalhe)
+
+# Mede a duração de um trecho: with medir("etapa"): ...
+@contextmanager
+def medir(etapa):
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        registrar(etapa, time.perf_counter() - inicio)
+
+def registrar_cache(cache, acerto):
+    obter_metricas().somar("cache_total", cache=cache, resultado="acerto" if acerto else "falta")
+
+# st.cache_data com contagem de acertos e faltas: a função original só roda quando falta no cache
+def cache_data_medido(**opcoes):
+    def decorador(funcao):
+        local = threading.local()
+
+        @functools.wraps(funcao)
+        def executar(*args, **kwargs):
+            local.falta = True
+            return funcao(*args, **kwargs)
+
+        cacheada = st.cache_data(**opcoes)(executar)
+
+        @functools.wraps(funcao)
+        def chamar(*args, **kwargs):
+            local.falta = False
+            inicio = time.perf_counter()
+            resultado = cacheada(*args, **kwargs)
+            registrar(funcao.__name__, time.perf_counter() - inicio, "falta no cache" if local.falta else "acerto no cache")
+            registrar_cache(funcao.__name__, not local.falta)
+            return resultado
+
+        chamar.clear = cacheada.clear
+        return chamar
+    return decorador
+
+# Ganchos do cliente HTTP do Supabase: tempo, bytes e linhas de cada requisição
+def _inicio_requisicao(request):
+    request.extensions["inicio_medicao"] = time.perf_counter()
+
+def _fim_requisicao(response):
+    response.read()
+    segundos = time.perf_counter() - response.request.extensions["inicio_medicao"]
+    recurso = response.request.url.path.rsplit("/", 1)[-1]
+    etapa = f"supabase {response.request.method} {recurso}"
+    metricas = obter_metricas()
+    metricas.somar("bytes_recebidos_total", len(response.content), recurso=recurso)
+    # O PostgREST informa as linhas devolvidas em Content-Range ("0-49/*")
+    linhas = 0
+    intervalo = response.headers.get("content-range", "").split("/")[0]
+    if "-" in intervalo:
+        inicio, fim = intervalo.split("-")
+        linhas = int(fim) - int(inicio) + 1
+        metricas.somar("linhas_recebidas_total", linhas, recurso=recurso)
+    registrar(etapa, segundos, f"{len(response.content)} bytes, {linhas} linhas")
+
+GANCHOS_HTTP = {"request": [_inicio_requisicao], "response": [_fim_requisicao]}
+
+# Início de cada rerun: zera a lista de medições da sessão
+def iniciar_rerun():
+    st.session_state.metricas_rerun = []
+    st.session_state.inicio_rerun = time.perf_counter()
+
+# Fim de cada rerun: registra a duração total, em todas as sessões (inclusive na tela de login)
+def finalizar_rerun():
+    if "inicio_rerun" in st.session_state:
+        registrar("rerun", time.perf_counter() - st.session_state.inicio_rerun)
+
+# Painel de desempenho: medições deste rerun e do processo (o app só exibe para supervisores)
+def exibir_painel_metricas():
+    if "metricas_rerun" not in st.session_state:
+        return
+    with st.expander("Desempenho"):
+        st.markdown("**Este rerun**")
+        st.dataframe(
+            [{"Etapa": etapa, "ms": round(ms, 1), "Detalhe": detalhe} for etapa, ms, detalhe in st.session_state.metricas_rerun],
+            hide_index=True
+        )
+        st.markdown("**Processo**")
+        st.dataframe(
+            [{"Etapa": etapa, "Chamadas": chamadas, "Média (ms)": round(media, 1), "Máximo (ms)": round(maximo, 1)}
+             for etapa, chamadas, media, maximo in obter_metricas().resumo()],
+            hide_index=True
+        )
@@ -0,0 +1,50 @@
+# Preenche a coluna "Rua" das visitas antigas que só têm o CEP
+# Uso: python -m crm.preencher_ruas
+# Os CEPs distintos são consultados em paralelo (com o mesmo cache do app) e cada CEP vira
+# um único update para todas as visitas que o usam
+import os
+from collections import defaultdict
+
+from crm.cep import ServicoCep, formatar_endereco, normalizar_cep
+from crm.conexao import criar_cliente
+
+LOTE = 1000
+
+# Lê, em lotes por id, as visitas sem rua preenchida
+def ler_visitas_sem_rua(supabase):
+    cursor = 0
+    while True:
+        lote = (
+            supabase.table("agendamentos").select("id,CEP")
+            .or_("Rua.is.null,Rua.eq.")
+            .gt("id", cursor).order("id").limit(LOTE).execute().data
+        )
+        yield from lote
+        if len(lote) < LOTE:
+            return
+        cursor = lote[-1]["id"]
+
+def main():
+    supabase = criar_cliente()
+    ids_por_cep = defaultdict(list)
+    for visita in ler_visitas_sem_rua(supabase):
+        cep = normalizar_cep(visita["CEP"])
+        if cep:
+            ids_por_cep[cep].append(visita["id"])
+    print(f"{sum(map(len, ids_por_cep.values()))} visitas sem rua, {len(ids_por_cep)} CEPs distintos")
+
+    enderecos = ServicoCep(os.environ.get("CACHE_CEP", "cache_cep.sqlite3")).consultar_varios(ids_por_cep)
+    atualizadas = 0
+    for cep, dados in enderecos.items():
+        if not dados:
+            continue
+        ids = ids_por_cep[cep]
+        for inicio in range(0, len(ids), LOTE):
+            supabase.table("agendamentos").update({"Rua": formatar_endereco(dados)}).in_("id", ids[inicio:inicio + LOTE]).execute()
+        atualizadas += len(ids)
+
+    sem_resposta = len(ids_por_cep) - len(enderecos)
+    print(f"{atualizadas} visitas atualizadas; {sem_resposta} CEPs sem resposta do ViaCEP (rode de novo mais tarde)")
+
+if __name__ == "__main__":
+    main()
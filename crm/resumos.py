@@ -0,0 +1,171 @@
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import date
+
+import pandas as pd
+import streamlit as st
+
+from crm.agendamentos import obter_cache_agendamentos
+from crm.exportacao import gerar_xlsx
+from crm.metricas import medir
+from crm.usuarios import obter_diretorio
+
+logger = logging.getLogger(__name__)
+
+# Intervalo entre duas atualizações dos resumos em segundo plano (segundos)
+INTERVALO_RESUMOS = 600
+
+COLUNAS_RESUMO = ["vendedor", "visitas", "fechadas", "valor"]
+
+# Resumo por vendedor (visitas, fechadas e valor) de um conjunto de visitas
+def resumir(visitas):
+    if visitas.empty:
+        return pd.DataFrame(columns=COLUNAS_RESUMO)
+    resumo = visitas.assign(fechada=visitas["Fechou"] == "Sim").groupby("Usuario").agg(
+        visitas=("id", "size"), fechadas=("fechada", "sum"), valor=("Valor", "sum")
+    )
+    return resumo.rename_axis("vendedor").reset_index()[COLUNAS_RESUMO]
+
+# Assinatura de cada dia de um conjunto de visitas: quantidade e última alteração
+def assinar_dias(visitas):
+    por_dia = visitas.groupby("DataVisita")["AtualizadoEm"].agg(["count", "max"])
+    return por_dia["count"].astype(str) + "|" + por_dia["max"].astype(str)
+
+# Resumos diários e planilhas prontas dos dias já encerrados, por vendedor e por equipe
+# Uma thread em segundo plano monta tudo a partir do cache de agendamentos (sem consultas extras ao
+# Supabase) e refaz só o que mudou: o resumo de cada dia tem a assinatura das visitas do dia, e a
+# planilha de cada dia e equipe, a das visitas da equipe mais a sua composição (mudar uma equipe não
+# refaz as outras). O dia de hoje não é materializado: ele é resumido na hora a partir do cache,
+# que já recebe as visitas novas incrementalmente
+class ResumosDiarios:
+    def __init__(self, cache, diretorio, pasta="resumos", intervalo=INTERVALO_RESUMOS):
+        self.cache = cache
+        self.diretorio = diretorio
+        self.pasta = pasta
+        self.intervalo = intervalo
+        self.lock = threading.Lock()
+        os.makedirs(pasta, exist_ok=True)
+        self.banco = sqlite3.connect(os.path.join(pasta, "resumos.sqlite3"), check_same_thread=False)
+        self.banco.execute(
+            "create table if not exists resumos ("
+            "dia text, vendedor text, visitas integer, fechadas integer, valor real, primary key (dia, vendedor))"
+        )
+        self.banco.execute("create table if not exists dias (dia text primary key, assinatura text)")
+        self.banco.execute("create table if not exists planilhas (dia text, equipe text, assinatura text, primary key (dia, equipe))")
+        self.banco.commit()
+        threading.Thread(target=self._atualizar_sempre, name="resumos-diarios", daemon=True).start()
+
+    def caminho_planilha(self, dia, equipe):
+        return os.path.join(self.pasta, dia, re.sub(r"[^\w-]", "_", equipe) + ".xlsx")
+
+    # Grava a planilha do dia de uma equipe (arquivo temporário trocado de uma vez)
+    def _gravar_planilha(self, caminho, visitas):
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        linhas = visitas.sort_values("id").astype(object).where(visitas.notna(), None).to_dict("records")
+        with open(caminho + ".tmp", "wb") as arquivo:
+            gerar_xlsx([linhas], arquivo)
+        os.replace(caminho + ".tmp", caminho)
+
+    def _resumir_dia(self, dia, visitas, assinatura):
+        resumo = resumir(visitas)
+        with self.lock:
+            self.banco.execute("delete from resumos where dia = ?", (dia,))
+            self.banco.executemany(
+                "insert into resumos (dia, vendedor, visitas, fechadas, valor) values (?, ?, ?, ?, ?)",
+                [(dia, linha.vendedor, int(linha.visitas), int(linha.fechadas), float(linha.valor)) for linha in resumo.itertuples()]
+            )
+            self.banco.execute("insert or replace into dias (dia, assinatura) values (?, ?)", (dia, assinatura))
+            self.banco.commit()
+
+    # Grava a planilha do dia da equipe, ou a apaga se a equipe não tem mais visitas nesse dia (assinatura None)
+    def _materializar_planilha(self, dia, equipe, visitas, assinatura):
+        caminho = self.caminho_planilha(dia, equipe)
+        if assinatura is not None:
+            self._gravar_planilha(caminho, visitas)
+        elif os.path.exists(caminho):
+            os.remove(caminho)
+        with self.lock:
+            if assinatura is None:
+                self.banco.execute("delete from planilhas where dia = ? and equipe = ?", (dia, equipe))
+            else:
+                self.banco.execute("insert or replace into planilhas (dia, equipe, assinatura) values (?, ?, ?)", (dia, equipe, assinatura))
+            self.banco.commit()
+
+    # Uma rodada: refaz os resumos e planilhas dos dias encerrados cuja assinatura mudou
+    # Retorna quantos dias tiveram algo refeito
+    def atualizar(self):
+        self.cache.sincronizar()
+        visitas = self.cache.visitas
+        datas = visitas["DataVisita"].fillna("")
+        encerradas = visitas[(datas != "") & (datas < date.today().isoformat())]
+        if encerradas.empty:
+            return 0
+        assinaturas = assinar_dias(encerradas)
+        with self.lock:
+            dias_salvos = dict(self.banco.execute("select dia, assinatura from dias").fetchall())
+            planilhas_salvas = {
+                (dia, equipe): assinatura
+                for dia, equipe, assinatura in self.banco.execute("select dia, equipe, assinatura from planilhas").fetchall()
+            }
+        dias_alterados = {dia for dia, assinatura in assinaturas.items() if dias_salvos.get(dia) != assinatura}
+
+        # Planilhas: cada equipe depende só das visitas dos seus vendedores e da sua composição
+        equipes = self.diretorio.equipes()
+        planilhas = {}  # (dia, equipe) -> assinatura atual
+        for equipe, vendedores in equipes.items():
+            composicao = hashlib.sha1("|".join(vendedores).encode("utf-8")).hexdigest()[:12]
+            for dia, assinatura in assinar_dias(encerradas[encerradas["Usuario"].isin(vendedores)]).items():
+                planilhas[(dia, equipe)] = assinatura + "|" + composicao
+        planilhas_alteradas = {chave: assinatura for chave, assinatura in planilhas.items() if planilhas_salvas.get(chave) != assinatura}
+        # Planilhas de equipes que não têm mais visitas no dia (ou que deixaram de existir)
+        planilhas_alteradas.update({chave: None for chave in planilhas_salvas if chave not in planilhas})
+
+        dias = dias_alterados | {dia for dia, _ in planilhas_alteradas}
+        if not dias:
+            return 0
+        with medir("resumos diários"):
+            for dia, do_dia in encerradas[encerradas["DataVisita"].isin(dias)].groupby("DataVisita"):
+                if dia in dias_alterados:
+                    self._resumir_dia(dia, do_dia, assinaturas[dia])
+            for (dia, equipe), assinatura in planilhas_alteradas.items():
+                da_equipe = encerradas[(encerradas["DataVisita"] == dia) & encerradas["Usuario"].isin(equipes.get(equipe, []))]
+                self._materializar_planilha(dia, equipe, da_equipe, assinatura)
+        return len(dias)
+
+    def _atualizar_sempre(self):
+        while True:
+            try:
+                self.atualizar()
+            except Exception:
+                logger.exception("Falha ao atualizar os resumos diários")
+            time.sleep(self.intervalo)
+
+    # Resumo do dia para os vendedores informados: do SQLite nos dias encerrados, do cache hoje
+    def resumo(self, dia, vendedores):
+        dia = dia.isoformat()
+        if dia < date.today().isoformat():
+            with self.lock:
+                pronto = self.banco.execute("select 1 from dias where dia = ?", (dia,)).fetchone()
+                if pronto:
+                    linhas = self.banco.execute(
+                        f"select vendedor, visitas, fechadas, valor from resumos where dia = ? and vendedor in ({','.join('?' * len(vendedores))})",
+                        (dia, *vendedores)
+                    ).fetchall()
+                    return pd.DataFrame(linhas, columns=COLUNAS_RESUMO)
+        visitas = self.cache.visitas
+        return resumir(visitas[(visitas["DataVisita"] == dia) & visitas["Usuario"].isin(vendedores)])
+
+    # Planilha pronta do dia para a equipe, ou None (dia em aberto ou ainda não materializado)
+    def planilha(self, dia, equipe):
+        caminho = self.caminho_planilha(dia.isoformat(), equipe)
+        return caminho if dia < date.today() and os.path.exists(caminho) else None
+
+# Resumos compartilhados pelo processo; a thread começa a materializar assim que o app sobe
+@st.cache_resource
+def obter_resumos():
+    return ResumosDiarios(obter_cache_agendamentos(), obter_diretorio(), os.environ.get("RESUMOS_PASTA", "resumos"))
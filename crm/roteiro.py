@@ -0,0 +1,151 @@
+import csv
+import os
+import re
+import sqlite3
+import threading
+
+import numpy as np
+import streamlit as st
+
+from crm.cep import normalizar_cep
+
+# Raio médio da Terra em km (distâncias do roteiro)
+RAIO_TERRA = 6371.0
+
+# Monta a chave do endereço: CEP com 8 dígitos + dígitos do número (vazio se não houver número)
+def chave_endereco(cep, numero=None):
+    cep = normalizar_cep(cep)
+    if cep is None:
+        return None
+    return cep + ":" + re.sub(r"\D", "", str(numero or ""))
+
+# Geocodificação dos endereços das visitas, sem depender de serviço externo
+# A base local é um CSV (cep;numero;latitude;longitude, número opcional; geocodigos.csv traz uma amostra
+# de CEPs de São Paulo). Só os endereços encontrados na base ficam guardados para sempre num SQLite
+# (endereços não mudam de lugar); as aproximações por CEP e por setor ficam só na memória do processo,
+# para que uma versão nova da base com o endereço exato seja usada
+class Geocodificador:
+    def __init__(self, arquivo="cache_geocodigos.sqlite3", base="geocodigos.csv"):
+        self.arquivo_base = base
+        self.base = None  # carregada na primeira consulta que não estiver no cache
+        self.memoria = {}  # chave -> (latitude, longitude), inclusive aproximações
+        self.lock = threading.Lock()
+
+        self.banco = sqlite3.connect(arquivo, check_same_thread=False)
+        self.banco.execute("create table if not exists geocodigos (chave text primary key, latitude real, longitude real)")
+        self.banco.commit()
+
+    # Lê a base local: coordenadas por endereço (CEP + número), por CEP e por setor (5 primeiros dígitos)
+    def _carregar_base(self):
+        enderecos, setores = {}, {}
+        if os.path.exists(self.arquivo_base):
+            with open(self.arquivo_base, encoding="utf-8-sig", newline="") as arquivo:
+                for linha in csv.DictReader(arquivo, delimiter=";"):
+                    chave = chave_endereco(linha["cep"], linha.get("numero"))
+                    if chave is None:
+                        continue
+                    ponto = (float(linha["latitude"]), float(linha["longitude"]))
+                    enderecos[chave] = ponto
+                    setores.setdefault(chave[:5], []).append(ponto)
+        # Setor: média dos pontos conhecidos, para CEPs que não estão na base
+        setores = {setor: tuple(np.mean(pontos, axis=0)) for setor, pontos in setores.items()}
+        return enderecos, setores
+
+    # Retorna (ponto, exato): exato indica que o endereço (CEP + número) está na base
+    def _procurar_base(self, chave):
+        if self.base is None:
+            self.base = self._carregar_base()
+        enderecos, setores = self.base
+        if chave in enderecos:
+            return enderecos[chave], True
+        cep = chave.split(":")[0]
+        return enderecos.get(cep + ":") or setores.get(cep[:5]), False
+
+    # Retorna (latitude, longitude) do endereço, ou None se ele não puder ser localizado
+    # Endereços não encontrados não são guardados: podem aparecer numa versão nova da base
+    def geocodificar(self, cep, numero=None):
+        chave = chave_endereco(cep, numero)
+        if chave is None:
+            return None
+        with self.lock:
+            if chave in self.memoria:
+                return self.memoria[chave]
+            linha = self.banco.execute("select latitude, longitude from geocodigos where chave = ?", (chave,)).fetchone()
+            if linha:
+                self.memoria[chave] = linha
+                return linha
+            ponto, exato = self._procurar_base(chave)
+            if ponto:
+                self.memoria[chave] = ponto
+            if exato:
+                self.banco.execute("insert or replace into geocodigos (chave, latitude, longitude) values (?, ?, ?)", (chave, *ponto))
+                self.banco.commit()
+            return ponto
+
+# Matriz de distâncias (km) entre todos os pontos, pela fórmula de haversine
+def matriz_distancias(pontos):
+    coordenadas = np.radians(np.asarray(pontos, dtype=float))
+    latitudes, longitudes = coordenadas[:, 0:1], coordenadas[:, 1:2]
+    a = (
+        np.sin((latitudes - latitudes.T) / 2) ** 2
+        + np.cos(latitudes) * np.cos(latitudes.T) * np.sin((longitudes - longitudes.T) / 2) ** 2
+    )
+    return 2 * RAIO_TERRA * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+# Ordena as paradas saindo da primeira: vizinho mais próximo e depois melhorias 2-opt
+# Retorna a ordem dos índices e a distância total (km) do percurso, sem volta ao início
+def ordenar_paradas(pontos):
+    quantidade = len(pontos)
+    if quantidade < 3:
+        distancia = matriz_distancias(pontos)[0, 1] if quantidade == 2 else 0.0
+        return list(range(quantidade)), float(distancia)
+    distancias = matriz_distancias(pontos)
+
+    ordem = [0]
+    restantes = set(range(1, quantidade))
+    while restantes:
+        atual = ordem[-1]
+        proximo = min(restantes, key=lambda parada: distancias[atual, parada])
+        ordem.append(proximo)
+        restantes.remove(proximo)
+
+    # 2-opt: inverte trechos do percurso enquanto isso encurtar o caminho (a primeira parada fica fixa)
+    melhorou = True
+    while melhorou:
+        melhorou = False
+        for i in range(1, quantidade - 1):
+            for j in range(i + 1, quantidade):
+                antes = distancias[ordem[i - 1], ordem[i]]
+                depois = distancias[ordem[i - 1], ordem[j]]
+                if j + 1 < quantidade:
+                    antes += distancias[ordem[j], ordem[j + 1]]
+                    depois += distancias[ordem[i], ordem[j + 1]]
+                if depois < antes - 1e-9:
+                    ordem[i:j + 1] = reversed(ordem[i:j + 1])
+                    melhorou = True
+
+    total = sum(distancias[a, b] for a, b in zip(ordem, ordem[1:]))
+    return ordem, float(total)
+
+# Monta o roteiro do dia a partir das visitas (DataFrame com CEP, Numero e Hora)
+# Retorna as visitas localizadas na ordem sugerida (com latitude/longitude), as não localizadas e a distância total
+def montar_roteiro(visitas, geocodificador):
+    visitas = visitas.sort_values("Hora", ignore_index=True)
+    numeros = visitas["Numero"] if "Numero" in visitas.columns else [None] * len(visitas)
+    pontos = [geocodificador.geocodificar(cep, numero) for cep, numero in zip(visitas["CEP"], numeros)]
+    localizadas = [indice for indice, ponto in enumerate(pontos) if ponto]
+    nao_localizadas = visitas.drop(index=localizadas).reset_index(drop=True)
+
+    ordem, distancia = ordenar_paradas([pontos[indice] for indice in localizadas])
+    roteiro = visitas.loc[[localizadas[indice] for indice in ordem]].reset_index(drop=True)
+    roteiro["latitude"] = [pontos[localizadas[indice]][0] for indice in ordem]
+    roteiro["longitude"] = [pontos[localizadas[indice]][1] for indice in ordem]
+    return roteiro, nao_localizadas, distancia
+
+# Geocodificador compartilhado entre as sessões (cache permanente em SQLite)
+@st.cache_resource
+def obter_geocodificador():
+    return Geocodificador(
+        os.environ.get("CACHE_GEOCODIGOS", "cache_geocodigos.sqlite3"),
+        os.environ.get("BASE_GEOCODIGOS", "geocodigos.csv")
+    )
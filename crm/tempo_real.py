@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+
+import streamlit as st
+from realtime import AsyncRealtimeClient, RealtimeSubscribeStates
+from streamlit.runtime import Runtime
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from crm.agendamentos import INTERVALO_SINCRONIZACAO, obter_cache_agendamentos
+from crm.conexao import obter_credenciais
+
+logger = logging.getLogger(__name__)
+
+# Com o realtime ativo, a sincronização periódica vira só uma garantia contra eventos perdidos
+INTERVALO_SINCRONIZACAO_REALTIME = 300
+# Verificação da conexão do realtime e espera entre tentativas de reconexão (dobra a cada falha, segundos)
+VERIFICACAO_REALTIME = 30
+ESPERA_RECONEXAO_INICIAL = 5
+ESPERA_RECONEXAO_MAXIMA = 300
+# Intervalo mínimo entre duas limpezas das sessões já encerradas
+INTERVALO_LIMPEZA_SESSOES = 60
+
+# Pede rerun a uma sessão aberta do Streamlit a partir de outra thread
+# Retorna False se a sessão não existe mais. O Streamlit não tem API pública para isso: os acessos
+# internos ficam só aqui, e se mudarem numa versão nova o realtime continua atualizando o cache,
+# só sem o rerun imediato (as sessões atualizam no próximo rerun normal)
+def pedir_rerun(session_id, apenas_conferir=False):
+    global _aviso_api_interna
+    if not Runtime.exists():
+        return False
+    try:
+        runtime = Runtime.instance()
+        info = runtime._session_mgr.get_active_session_info(session_id)
+        if info is None:
+            return False
+        if not apenas_conferir:
+            # Reroda com o último estado do navegador: com None o Streamlit zera a query string (e o token da URL)
+            runtime._get_async_objs().eventloop.call_soon_threadsafe(info.session.request_rerun, info.session._client_state)
+        return True
+    except (AttributeError, RuntimeError):
+        if not _aviso_api_interna:
+            _aviso_api_interna = True
+            logger.warning("Esta versão do Streamlit não permite pedir rerun às sessões; o realtime só atualiza o cache", exc_info=True)
+        return False
+
+_aviso_api_interna = False
+
+# Publicador das alterações em agendamentos vindas do Supabase Realtime
+# O cliente de realtime do supabase-py é assíncrono, então roda num event loop próprio em segundo plano
+# Se a conexão cair (ou nem abrir), tenta de novo com espera crescente; enquanto isso vale a sincronização periódica
+class PublicadorSupabase:
+    def __init__(self, url, key):
+        self.url = url.replace("http", "ws", 1).rstrip("/") + "/realtime/v1"
+        self.key = key
+        self.callbacks = []
+        self.ao_conectar = []
+        self.conectado = False
+        threading.Thread(target=asyncio.run, args=(self._escutar(),), name="realtime-agendamentos", daemon=True).start()
+
+    def assinar(self, callback, ao_conectar=None):
+        self.callbacks.append(callback)
+        if ao_conectar:
+            self.ao_conectar.append(ao_conectar)
+
+    def _publicar(self, payload):
+        dados = payload["data"]
+        if dados["type"] in ("INSERT", "UPDATE") and dados.get("record"):
+            for callback in self.callbacks:
+                callback(dados["record"])
+
+    def _mudar_estado(self, estado, erro=None):
+        self.conectado = estado == RealtimeSubscribeStates.SUBSCRIBED
+        for callback in self.ao_conectar:
+            callback(self.conectado)
+
+    async def _escutar(self):
+        espera = ESPERA_RECONEXAO_INICIAL
+        while True:
+            cliente = None
+            try:
+                cliente = AsyncRealtimeClient(self.url, self.key)
+                await cliente.connect()
+                canal = cliente.channel("agendamentos")
+                canal.on_postgres_changes("*", schema="public", table="agendamentos", callback=self._publicar)
+                await canal.subscribe(self._mudar_estado)
+                while True:
+                    await asyncio.sleep(VERIFICACAO_REALTIME)
+                    if not (cliente.is_connected and self.conectado):
+                        break
+                    espera = ESPERA_RECONEXAO_INICIAL
+                logger.warning("Realtime desconectado; reconectando em %d s", espera)
+            except Exception as e:
+                logger.warning("Realtime indisponível (%s); nova tentativa em %d s", e, espera)
+            self._mudar_estado(RealtimeSubscribeStates.CLOSED)
+            if cliente is not None:
+                try:
+                    await cliente.close()
+                except Exception:
+                    pass
+            await asyncio.sleep(espera)
+            espera = min(espera * 2, ESPERA_RECONEXAO_MAXIMA)
+
+# Publicador local com a mesma interface, para testes e desenvolvimento sem Supabase Realtime
+# (bench/tempo_real.py o liga ao Supabase falso para conferir o assinante)
+class PublicadorLocal:
+    def __init__(self):
+        self.callbacks = []
+        self.conectado = False
+
+    def assinar(self, callback, ao_conectar=None):
+        self.callbacks.append(callback)
+
+    def publicar(self, linha):
+        for callback in self.callbacks:
+            callback(linha)
+
+# Assinante que aplica as alterações no cache compartilhado e pede rerun só às sessões afetadas
+# As sessões encerradas saem do registro quando recebem um evento ou na limpeza periódica
+class AssinanteAgendamentos:
+    def __init__(self, cache, publicador, rerun=pedir_rerun):
+        self.cache = cache
+        self.publicador = publicador
+        self.rerun = rerun
+        self.sessoes = {}  # id da sessão -> (usuários, data) exibidos; None = qualquer um
+        self.ultima_limpeza = time.monotonic()
+        self.lock = threading.Lock()
+        publicador.assinar(self.receber, ao_conectar=self.mudar_conexao)
+
+    def mudar_conexao(self, conectado):
+        self.cache.intervalo = INTERVALO_SINCRONIZACAO_REALTIME if conectado else INTERVALO_SINCRONIZACAO
+        if conectado:
+            # Recupera o que mudou enquanto o canal estava desconectado
+            self.cache.ultima_sincronizacao = 0.0
+
+    # Registra a sessão atual como interessada nas visitas de alguns usuários e/ou de um dia
+    def registrar_sessao(self, usuarios=None, data=None):
+        ctx = get_script_run_ctx()
+        if ctx is not None:
+            self.registrar(ctx.session_id, usuarios, data)
+
+    def registrar(self, session_id, usuarios=None, data=None):
+        with self.lock:
+            self.sessoes[session_id] = (frozenset(usuarios) if usuarios is not None else None, data.isoformat() if data else None)
+            limpar = time.monotonic() - self.ultima_limpeza > INTERVALO_LIMPEZA_SESSOES
+            if limpar:
+                self.ultima_limpeza = time.monotonic()
+                sessoes = list(self.sessoes)
+        if limpar:
+            encerradas = [sessao for sessao in sessoes if not self.rerun(sessao, apenas_conferir=True)]
+            with self.lock:
+                for sessao in encerradas:
+                    self.sessoes.pop(sessao, None)
+
+    def receber(self, linha):
+        self.cache.aplicar([linha])
+        with self.lock:
+            sessoes = list(self.sessoes.items())
+        for session_id, (usuarios, data) in sessoes:
+            if (usuarios is not None and linha.get("Usuario") not in usuarios) or data not in (None, linha.get("DataVisita")):
+                continue
+            if not self.rerun(session_id):
+                with self.lock:
+                    self.sessoes.pop(session_id, None)
+
+# Um único assinante por processo, criado junto com a conexão
+@st.cache_resource
+def obter_assinante_agendamentos():
+    if os.environ.get("SUPABASE_REALTIME", "1") == "0":
+        publicador = PublicadorLocal()
+    else:
+        publicador = PublicadorSupabase(*obter_credenciais())
+    return AssinanteAgendamentos(obter_cache_agendamentos(), publicador)
@@ -0,0 +1,112 @@
+import threading
+import time
+
+import bcrypt
+import streamlit as st
+
+from crm.conexao import init_connection
+
+# Intervalo mínimo entre duas verificações de alteração na tabela de usuários
+INTERVALO_DIRETORIO = 30
+
+# Função para inserir usuários iniciais
+def inserir_usuarios_iniciais(supabase):
+    # Verifica se existem usuários
+    response = supabase.table("usuarios").select("count").execute()
+    count = 0
+    if response.data:
+        count = response.data[0]['count']
+
+    if count == 0:
+        # Usuários iniciais com senhas hasheadas
+        usuarios = [
+            {"nome": "Cláudia Costa", "login": "Claudia", "senha": bcrypt.hashpw("1501".encode('utf-8'), bcrypt.gensalt()).decode('utf-8'), "papel": "vendedor", "equipe": "principal"},
+            {"nome": "Evandro Alexandre", "login": "Evandro", "senha": bcrypt.hashpw("0512".encode('utf-8'), bcrypt.gensalt()).decode('utf-8'), "papel": "vendedor", "equipe": "principal"},
+            {"nome": "Renan", "login": "Renan", "senha": bcrypt.hashpw("1710".encode('utf-8'), bcrypt.gensalt()).decode('utf-8'), "papel": "supervisor", "equipe": "principal"},
+            {"nome": "Cauã Moreira", "login": "Caua", "senha": bcrypt.hashpw("2805".encode('utf-8'), bcrypt.gensalt()).decode('utf-8'), "papel": "supervisor", "equipe": "principal"}
+        ]
+
+        supabase.table("usuarios").insert(usuarios).execute()
+
+# Função para autenticar usuário
+def autenticar_usuario(login, senha):
+    response = init_connection().table("usuarios").select("senha, nome").eq("login", login).execute()
+
+    if response.data:
+        senha_hash = response.data[0]['senha']
+        nome = response.data[0]['nome']
+
+        if bcrypt.checkpw(senha.encode('utf-8'), senha_hash.encode('utf-8')):
+            return nome
+
+    return None
+
+# Diretório de usuários (papel e equipe de cada login) compartilhado pelo processo
+# Só é relido quando a tabela muda: a verificação busca uma linha só (última alteração e total de usuários)
+class DiretorioUsuarios:
+    def __init__(self, cliente, intervalo=INTERVALO_DIRETORIO):
+        self.cliente = cliente
+        self.intervalo = intervalo
+        self.usuarios = {}  # login -> {"nome", "papel", "equipe"}
+        self.versao = None
+        self.ultima_verificacao = 0.0
+        self.lock = threading.Lock()
+
+    def _atualizar(self):
+        if time.monotonic() - self.ultima_verificacao < self.intervalo:
+            return
+        with self.lock:
+            if time.monotonic() - self.ultima_verificacao < self.intervalo:
+                return
+            self.ultima_verificacao = time.monotonic()
+            response = (
+                self.cliente.table("usuarios").select("atualizado_em", count="exact")
+                .order("atualizado_em", desc=True).limit(1).execute()
+            )
+            versao = (response.data[0]["atualizado_em"] if response.data else None, response.count)
+            if versao == self.versao and self.usuarios:
+                return
+            linhas = self.cliente.table("usuarios").select("login,nome,papel,equipe").execute().data
+            self.usuarios = {linha["login"]: linha for linha in linhas}
+            self.versao = versao
+
+    # Força a releitura na próxima consulta (usado depois de alterar usuários pelo app)
+    def invalidar(self):
+        self.ultima_verificacao = 0.0
+        self.versao = None
+
+    def papel(self, login):
+        self._atualizar()
+        usuario = self.usuarios.get(login)
+        return usuario["papel"] if usuario else None
+
+    # Vendedores que o supervisor acompanha: os da sua equipe (supervisor sem equipe vê todos)
+    def equipe(self, login):
+        self._atualizar()
+        usuarios = self.usuarios
+        supervisor = usuarios.get(login) or {}
+        return sorted(
+            vendedor for vendedor, dados in usuarios.items()
+            if dados["papel"] == "vendedor" and (supervisor.get("equipe") is None or dados["equipe"] == supervisor["equipe"])
+        )
+
+    # Nome da equipe do supervisor ("todos" para supervisor sem equipe)
+    def nome_equipe(self, login):
+        self._atualizar()
+        return (self.usuarios.get(login) or {}).get("equipe") or "todos"
+
+    # Vendedores de cada equipe acompanhada por algum supervisor ("todos" se houver supervisor sem equipe)
+    def equipes(self):
+        self._atualizar()
+        supervisores = [login for login, dados in self.usuarios.items() if dados["papel"] == "supervisor"]
+        return {self.nome_equipe(login): self.equipe(login) for login in sorted(supervisores)}
+
+@st.cache_resource
+def obter_diretorio():
+    return DiretorioUsuarios(init_connection())
+
+def eh_supervisor(login):
+    return obter_diretorio().papel(login) == "supervisor"
+
+def vendedores_da_equipe(login):
+    return obter_diretorio().equipe(login)
@@ -0,0 +1,13 @@
+-- Colunas nativas de data e hora para agendamentos
+-- "Data" (DD/MM/YYYY) e "Hora" (HH:MM) continuam sendo gravadas em texto durante a transição,
+-- mas filtros e ordenação passam a usar "DataVisita" e "HoraVisita".
+alter table agendamentos add column if not exists "DataVisita" date;
+alter table agendamentos add column if not exists "HoraVisita" time;
+
+-- Consultas por vendedor e dia (ou intervalo de dias) viram buscas no índice
+create index if not exists agendamentos_usuario_data_idx
+    on agendamentos ("Usuario", "DataVisita");
+
+-- Filtro "Todos" do acompanhamento (somente por dia)
+create index if not exists agendamentos_data_idx
+    on agendamentos ("DataVisita");
@@ -0,0 +1,39 @@
+-- Preenche "DataVisita" e "HoraVisita" das linhas gravadas antes da migração 001
+-- Pode ser executado mais de uma vez: só altera linhas que ainda estão sem as colunas novas
+
+-- Conversões que devolvem null em vez de erro: um valor no formato certo mas inválido ("31/02/2024",
+-- "25:00") não interrompe o update inteiro, fica sem conversão e aparece no relatório abaixo
+-- (funções temporárias, só desta sessão)
+create or replace function pg_temp.converter_data(texto text) returns date
+language plpgsql immutable as $$
+begin
+    return to_date(texto, 'DD/MM/YYYY');
+exception when others then
+    return null;
+end;
+$$;
+
+create or replace function pg_temp.converter_hora(texto text) returns time
+language plpgsql immutable as $$
+begin
+    return texto::time;
+exception when others then
+    return null;
+end;
+$$;
+
+update agendamentos
+set "DataVisita" = pg_temp.converter_data("Data")
+where "DataVisita" is null
+  and "Data" ~ '^\d{2}/\d{2}/\d{4}$';
+
+update agendamentos
+set "HoraVisita" = pg_temp.converter_hora("Hora")
+where "HoraVisita" is null
+  and "Hora" ~ '^\d{1,2}:\d{2}(:\d{2})?$';
+
+-- Linhas que não puderam ser convertidas (corrigir manualmente)
+select id, "Data", "Hora", "Usuario"
+from agendamentos
+where "DataVisita" is null or "HoraVisita" is null
+order by id;
@@ -0,0 +1,20 @@
+-- Marca de última alteração usada pela sincronização incremental do cache de agendamentos
+alter table agendamentos add column if not exists "AtualizadoEm" timestamptz not null default now();
+
+create or replace function agendamentos_atualizado_em()
+returns trigger
+language plpgsql
+as $$
+begin
+    new."AtualizadoEm" := now();
+    return new;
+end;
+$$;
+
+drop trigger if exists agendamentos_atualizado_em on agendamentos;
+create trigger agendamentos_atualizado_em
+    before update on agendamentos
+    for each row execute function agendamentos_atualizado_em();
+
+create index if not exists agendamentos_atualizado_em_idx
+    on agendamentos ("AtualizadoEm");
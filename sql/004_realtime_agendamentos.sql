@@ -0,0 +1,3 @@
+-- Publica inserções e alterações de agendamentos no Supabase Realtime
+-- (usado pelo assinante que mantém o cache compartilhado e o acompanhamento atualizados)
+alter publication supabase_realtime add table agendamentos;
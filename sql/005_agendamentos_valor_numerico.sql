@@ -0,0 +1,25 @@
+-- "Valor" passa de texto livre ("R$ 1.234,56", "1234.56", ...) para numérico
+-- O texto original fica guardado em "ValorTexto" para conferência
+alter table agendamentos add column if not exists "ValorTexto" text;
+update agendamentos set "ValorTexto" = "Valor"::text where "ValorTexto" is null;
+
+alter table agendamentos alter column "Valor" type numeric(12, 2) using (
+    case
+        -- "1.234,56" / "R$ 1.234,56": vírgula decimal, pontos de milhar
+        when regexp_replace("Valor"::text, '[^0-9,.-]', '', 'g') ~ '^-?[0-9.]*,[0-9]+$'
+            then replace(replace(regexp_replace("Valor"::text, '[^0-9,.-]', '', 'g'), '.', ''), ',', '.')::numeric
+        -- "1.234" / "1.234.567": somente pontos de milhar
+        when regexp_replace("Valor"::text, '[^0-9,.-]', '', 'g') ~ '^-?[0-9]{1,3}(\.[0-9]{3})+$'
+            then replace(regexp_replace("Valor"::text, '[^0-9,.-]', '', 'g'), '.', '')::numeric
+        -- "1234.56" / "1234"
+        when regexp_replace("Valor"::text, '[^0-9,.-]', '', 'g') ~ '^-?[0-9]+(\.[0-9]+)?$'
+            then regexp_replace("Valor"::text, '[^0-9,.-]', '', 'g')::numeric
+        else null
+    end
+);
+
+-- Valores que não puderam ser convertidos (corrigir manualmente a partir de "ValorTexto")
+select id, "ValorTexto", "Usuario"
+from agendamentos
+where "Valor" is null and coalesce(trim("ValorTexto"), '') <> ''
+order by id;
@@ -0,0 +1,51 @@
+-- Indicadores do acompanhamento de visitas, calculados no banco (o app não baixa as linhas)
+-- Uso pelo app: supabase.rpc("kpis_visitas", {"data_inicio": ..., "data_fim": ..., "vendedor": ...})
+create or replace function kpis_visitas(data_inicio date, data_fim date, vendedor text default null)
+returns json
+language sql
+stable
+as $$
+    with visitas as (
+        select "Usuario", "Fechou", "Valor", "DataVisita"
+        from agendamentos
+        where "DataVisita" between data_inicio and data_fim
+          and (vendedor is null or "Usuario" = vendedor)
+    )
+    select json_build_object(
+        'por_fechou', (
+            select coalesce(json_agg(t order by t.visitas desc), '[]'::json)
+            from (
+                select "Fechou" as fechou, count(*) as visitas
+                from visitas
+                group by "Fechou"
+            ) t
+        ),
+        'por_vendedor', (
+            select coalesce(json_agg(t order by t.valor desc), '[]'::json)
+            from (
+                select "Usuario" as vendedor,
+                       count(*) as visitas,
+                       count(*) filter (where "Fechou" = 'Sim') as fechadas,
+                       coalesce(sum("Valor"), 0) as valor
+                from visitas
+                group by "Usuario"
+            ) t
+        ),
+        'por_dia', (
+            select coalesce(json_agg(t order by t.dia), '[]'::json)
+            from (
+                select "DataVisita" as dia, count(*) as visitas
+                from visitas
+                group by "DataVisita"
+            ) t
+        ),
+        'por_semana', (
+            select coalesce(json_agg(t order by t.semana), '[]'::json)
+            from (
+                select date_trunc('week', "DataVisita")::date as semana, count(*) as visitas
+                from visitas
+                group by 1
+            ) t
+        )
+    );
+$$;
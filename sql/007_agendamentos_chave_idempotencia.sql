@@ -0,0 +1,6 @@
+-- Chave gerada pelo app para cada visita cadastrada
+-- Garante que reenvios da fila local (após falha de rede) não dupliquem a visita
+alter table agendamentos add column if not exists "ChaveIdempotencia" uuid;
+
+create unique index if not exists agendamentos_chave_idempotencia_idx
+    on agendamentos ("ChaveIdempotencia");
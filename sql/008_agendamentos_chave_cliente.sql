@@ -0,0 +1,11 @@
+-- Chave normalizada do cliente: dígitos do telefone (sem zeros à esquerda, sem o código do país 55
+-- quando sobram 10 ou 11 dígitos, últimos 11) + dígitos do CEP
+-- Deve gerar o mesmo valor que crm.formatacao.chave_cliente
+alter table agendamentos add column if not exists "ChaveCliente" text generated always as (
+    nullif(right(regexp_replace(ltrim(regexp_replace(coalesce("Telefone", ''), '\D', '', 'g'), '0'), '^55(\d{10,11})$', '\1'), 11), '')
+    || ':' || regexp_replace(coalesce("CEP", ''), '\D', '', 'g')
+) stored;
+
+-- Aviso de cliente repetido no formulário e histórico do cliente no acompanhamento
+create index if not exists agendamentos_chave_cliente_idx
+    on agendamentos ("ChaveCliente", id desc);
@@ -0,0 +1,3 @@
+-- Número do endereço digitado no formulário (antes era descartado)
+-- Usado com o CEP para localizar a visita no roteiro do dia
+alter table agendamentos add column if not exists "Numero" text;
@@ -0,0 +1,48 @@
+-- Busca textual nas visitas (nome do cliente, endereço e observação), feita no banco
+-- Uso pelo app: supabase.rpc("buscar_visitas", {"termo": ..., "vendedor": ..., "limite": ..., "deslocamento": ...})
+create extension if not exists pg_trgm with schema extensions;
+create extension if not exists unaccent with schema extensions;
+
+-- Texto normalizado (minúsculo e sem acentos); imutável para poder ser usado em coluna gerada e índice
+create or replace function texto_busca(nome text, rua text, observacao text)
+returns text
+language sql
+immutable
+parallel safe
+as $$
+    select lower(extensions.unaccent('extensions.unaccent'::regdictionary, concat_ws(' ', nome, rua, observacao)));
+$$;
+
+alter table agendamentos add column if not exists "TextoBusca" text
+    generated always as (texto_busca("Nome", "Rua", "Observacao")) stored;
+
+-- Palavras inteiras (com radicais em português) e trechos/erros de digitação (trigramas)
+create index if not exists agendamentos_busca_fts_idx
+    on agendamentos using gin (to_tsvector('portuguese', "TextoBusca"));
+create index if not exists agendamentos_busca_trgm_idx
+    on agendamentos using gin ("TextoBusca" extensions.gin_trgm_ops);
+
+-- Visitas encontradas, das mais relevantes para as menos relevantes, uma página por chamada
+create or replace function buscar_visitas(termo text, vendedor text default null, limite int default 50, deslocamento int default 0)
+returns json
+language sql
+stable
+as $$
+    with consulta as (
+        select websearch_to_tsquery('portuguese', texto_busca(termo, null, null)) as palavras,
+               texto_busca(termo, null, null) as texto
+    )
+    select coalesce(json_agg(t order by t.relevancia desc, t.id desc), '[]'::json)
+    from (
+        select a.id, a."Data", a."Hora", a."Nome", a."Telefone", a."Rua", a."Numero", a."CEP",
+               a."Fechou", a."Valor", a."Observacao", a."Usuario",
+               ts_rank(to_tsvector('portuguese', a."TextoBusca"), c.palavras)
+                   + extensions.word_similarity(c.texto, a."TextoBusca") as relevancia
+        from agendamentos a, consulta c
+        where (to_tsvector('portuguese', a."TextoBusca") @@ c.palavras
+               or c.texto operator(extensions.<%) a."TextoBusca")
+          and (vendedor is null or a."Usuario" = vendedor)
+        order by relevancia desc, a.id desc
+        limit limite offset deslocamento
+    ) t;
+$$;
@@ -0,0 +1,105 @@
+-- Papel (vendedor ou supervisor) e equipe de cada usuário, no lugar das listas fixas do app
+-- O supervisor vê as visitas dos vendedores da sua equipe; supervisor sem equipe vê todos
+alter table usuarios add column if not exists "papel" text not null default 'vendedor';
+alter table usuarios add column if not exists "equipe" text;
+alter table usuarios drop constraint if exists usuarios_papel_check;
+alter table usuarios add constraint usuarios_papel_check check ("papel" in ('vendedor', 'supervisor'));
+
+-- Usuários existentes: os supervisores que estavam fixos no código, todos numa mesma equipe
+update usuarios set "papel" = 'supervisor' where login in ('Caua', 'Renan');
+update usuarios set "equipe" = 'principal' where "equipe" is null;
+
+-- Marca de alteração: o app recarrega o diretório de usuários quando ela muda
+alter table usuarios add column if not exists "atualizado_em" timestamptz not null default now();
+
+create or replace function usuarios_atualizado_em()
+returns trigger
+language plpgsql
+as $$
+begin
+    new."atualizado_em" := now();
+    return new;
+end;
+$$;
+
+drop trigger if exists usuarios_atualizado_em on usuarios;
+create trigger usuarios_atualizado_em
+    before update on usuarios
+    for each row execute function usuarios_atualizado_em();
+
+-- Indicadores e busca passam a receber a lista de vendedores visíveis (a equipe do supervisor)
+drop function if exists kpis_visitas(date, date, text);
+create or replace function kpis_visitas(data_inicio date, data_fim date, vendedores text[] default null)
+returns json
+language sql
+stable
+as $$
+    with visitas as (
+        select "Usuario", "Fechou", "Valor", "DataVisita"
+        from agendamentos
+        where "DataVisita" between data_inicio and data_fim
+          and (vendedores is null or "Usuario" = any(vendedores))
+    )
+    select json_build_object(
+        'por_fechou', (
+            select coalesce(json_agg(t order by t.visitas desc), '[]'::json)
+            from (
+                select "Fechou" as fechou, count(*) as visitas
+                from visitas
+                group by "Fechou"
+            ) t
+        ),
+        'por_vendedor', (
+            select coalesce(json_agg(t order by t.valor desc), '[]'::json)
+            from (
+                select "Usuario" as vendedor,
+                       count(*) as visitas,
+                       count(*) filter (where "Fechou" = 'Sim') as fechadas,
+                       coalesce(sum("Valor"), 0) as valor
+                from visitas
+                group by "Usuario"
+            ) t
+        ),
+        'por_dia', (
+            select coalesce(json_agg(t order by t.dia), '[]'::json)
+            from (
+                select "DataVisita" as dia, count(*) as visitas
+                from visitas
+                group by "DataVisita"
+            ) t
+        ),
+        'por_semana', (
+            select coalesce(json_agg(t order by t.semana), '[]'::json)
+            from (
+                select date_trunc('week', "DataVisita")::date as semana, count(*) as visitas
+                from visitas
+                group by 1
+            ) t
+        )
+    );
+$$;
+
+drop function if exists buscar_visitas(text, text, int, int);
+create or replace function buscar_visitas(termo text, vendedores text[] default null, limite int default 50, deslocamento int default 0)
+returns json
+language sql
+stable
+as $$
+    with consulta as (
+        select websearch_to_tsquery('portuguese', texto_busca(termo, null, null)) as palavras,
+               texto_busca(termo, null, null) as texto
+    )
+    select coalesce(json_agg(t order by t.relevancia desc, t.id desc), '[]'::json)
+    from (
+        select a.id, a."Data", a."Hora", a."Nome", a."Telefone", a."Rua", a."Numero", a."CEP",
+               a."Fechou", a."Valor", a."Observacao", a."Usuario",
+               ts_rank(to_tsvector('portuguese', a."TextoBusca"), c.palavras)
+                   + extensions.word_similarity(c.texto, a."TextoBusca") as relevancia
+        from agendamentos a, consulta c
+        where (to_tsvector('portuguese', a."TextoBusca") @@ c.palavras
+               or c.texto operator(extensions.<%) a."TextoBusca")
+          and (vendedores is null or a."Usuario" = any(vendedores))
+        order by relevancia desc, a.id desc
+        limit limite offset deslocamento
+    ) t;
+$$;
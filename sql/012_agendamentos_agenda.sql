@@ -0,0 +1,3 @@
+-- Agenda semanal e conferência de conflito de horário: intervalo de dias e horários por vendedor
+create index if not exists agendamentos_usuario_data_hora_idx
+    on agendamentos ("Usuario", "DataVisita", "HoraVisita");